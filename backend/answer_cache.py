@@ -0,0 +1,116 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+# Cosine similarity a new question needs to reuse a previous answer.
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "5000"))
+
+
+@dataclass
+class CachedAnswer:
+    scope: Tuple[int, ...]
+    question: str
+    vector: np.ndarray
+    answer: str
+    created_at: float
+    # The model that produced the answer
+    model: str
+
+
+class SemanticAnswerCache:
+    """In-process cache of answers matched by question-embedding similarity.
+
+    An entry only matches questions asked against exactly the same set of
+    documents (``scope``) and, when a ``model`` is asked for, answered by
+    that model. Entries expire after ``ttl`` seconds and the least
+    recently used ones are dropped beyond ``max_entries``.
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, ttl: int = ANSWER_CACHE_TTL,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._by_scope = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def scope_key(file_ids: Iterable[int]) -> Tuple[int, ...]:
+        return tuple(sorted(set(file_ids)))
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id, None)
+        if entry is not None:
+            ids = self._by_scope.get(entry.scope)
+            ids.remove(entry_id)
+            if not ids:
+                del self._by_scope[entry.scope]
+
+    def lookup(self, scope: Tuple[int, ...], vector: List[float], model: Optional[str] = None) -> Optional[CachedAnswer]:
+        query = self._normalize(vector)
+        now = time.time()
+        with self._lock:
+            best_id, best_score = None, self.threshold
+            for entry_id in list(self._by_scope.get(scope, ())):
+                entry = self._entries[entry_id]
+                if now - entry.created_at > self.ttl:
+                    self._remove(entry_id)
+                    continue
+                if model is not None and entry.model != model:
+                    continue
+                score = float(entry.vector @ query)
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+            if best_id is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best_id)
+            return self._entries[best_id]
+
+    def store(self, scope: Tuple[int, ...], question: str, vector: List[float], answer: str, model: str):
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = CachedAnswer(scope, question, self._normalize(vector), answer, time.time(), model)
+            self._by_scope.setdefault(scope, []).append(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_files(self, file_ids: Iterable[int]):
+        """Drop every answer computed over a document set that includes any of ``file_ids``."""
+        file_ids = set(file_ids)
+        with self._lock:
+            for scope in [scope for scope in self._by_scope if file_ids.intersection(scope)]:
+                for entry_id in list(self._by_scope[scope]):
+                    self._remove(entry_id)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+        }
+
+
+answer_cache = SemanticAnswerCache()
@@ -0,0 +1,84 @@
+import hashlib
+import json
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Tuple
+
+from backend.db_utils import get_artifact, put_artifact
+
+
+# Bump an artifact's version whenever its prompt changes so stale entries are ignored.
+PROMPT_VERSIONS = {
+    "summary": 1,
+    "section_summary": 1,
+    "challenge_questions": 1,
+}
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """Collapses concurrent calls for the same key into one execution."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight: Dict[Tuple, Future] = {}
+
+    def do(self, key: Tuple, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[key] = future
+        if not leader:
+            return future.result()
+
+        try:
+            future.set_result(fn())
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+        return future.result()
+
+
+single_flight = SingleFlight()
+
+
+def artifact_key(content: str, artifact_type: str, model: str) -> Tuple:
+    # Keyed by content rather than file_id, so every upload of the same document shares artifacts
+    return (content_hash(content), artifact_type, model, PROMPT_VERSIONS[artifact_type])
+
+
+def lookup_artifact(content: str, artifact_type: str, model: str) -> Any:
+    payload = get_artifact(*artifact_key(content, artifact_type, model))
+    return json.loads(payload) if payload is not None else None
+
+
+def store_artifact(content: str, artifact_type: str, model: str, value: Any):
+    put_artifact(*artifact_key(content, artifact_type, model), json.dumps(value))
+
+
+def get_or_create_artifact(content: str, artifact_type: str, model: str,
+                           factory: Callable[[], Any], regenerate: bool = False) -> Any:
+    """Return the stored artifact for this content, generating it at most once.
+
+    Concurrent misses for the same artifact share a single ``factory`` call.
+    """
+    if not regenerate:
+        value = lookup_artifact(content, artifact_type, model)
+        if value is not None:
+            return value
+
+    key = artifact_key(content, artifact_type, model)
+
+    def generate():
+        value = factory()
+        put_artifact(*key, json.dumps(value))
+        return value
+
+    return single_flight.do(key, generate)
@@ -0,0 +1,123 @@
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import List, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.prompts import ChatPromptTemplate
+
+from backend.db_utils import get_chat_turns, get_session_summary, upsert_session_summary
+from backend.langchain_utils import output_parser
+from backend.llm_clients import model_pool
+from backend.model_router import route_chat_memory, routed
+from backend.token_utils import count_message_tokens
+
+
+# Most recent turns sent verbatim; anything older is folded into a rolling summary.
+CHAT_MEMORY_TURNS = int(os.getenv("CHAT_MEMORY_TURNS", "6"))
+# Older turns are folded in once this many have piled up, one LLM call per batch;
+# until then they are still sent verbatim if the token budget allows.
+CHAT_MEMORY_COMPACT_BATCH = max(1, int(os.getenv("CHAT_MEMORY_COMPACT_BATCH", "4")))
+# Upper bound on history tokens (summary + verbatim turns) per request.
+CHAT_MEMORY_TOKEN_BUDGET = int(os.getenv("CHAT_MEMORY_TOKEN_BUDGET", "2000"))
+
+summary_update_prompt = ChatPromptTemplate.from_messages([
+    ("system", "You maintain a running summary of a conversation between a user and a research assistant. "
+               "Update the summary with the new turns below. Keep the facts, questions and conclusions that later "
+               "questions may refer to. Reply with the updated summary only, in no more than 200 words."),
+    ("human", "Current summary:\n{summary}\n\nNew turns:\n{turns}")
+])
+
+# session_id -> [lock, holders]; an entry is dropped when its last holder leaves
+_session_locks = {}
+_session_locks_guard = threading.Lock()
+
+
+@contextmanager
+def _session_lock(session_id: str):
+    with _session_locks_guard:
+        entry = _session_locks.setdefault(session_id, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _session_locks_guard:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _session_locks[session_id]
+
+
+def _turn_messages(turn: dict) -> List[BaseMessage]:
+    return [HumanMessage(content=turn['user_query']), AIMessage(content=turn['gpt_response'])]
+
+
+def _summary_messages(summary: str) -> List[BaseMessage]:
+    if not summary:
+        return []
+    return [SystemMessage(content=f"Summary of the earlier conversation: {summary}")]
+
+
+def _recent_window(turns: List[dict], summary_tokens: int, max_turns: int = CHAT_MEMORY_TURNS) -> int:
+    """Index of the first of the last ``max_turns`` turns that still fits the token budget."""
+    start = max(0, len(turns) - max_turns)
+    used = summary_tokens
+    for i in range(len(turns) - 1, start - 1, -1):
+        used += count_message_tokens(_turn_messages(turns[i]))
+        # Always keep the latest turn so follow-up questions have something to refer to
+        if used > CHAT_MEMORY_TOKEN_BUDGET and i < len(turns) - 1:
+            return i + 1
+    return start
+
+
+def _unsummarized_turns() -> int:
+    # The most turns that can be waiting outside the summary between two compactions
+    return CHAT_MEMORY_TURNS + CHAT_MEMORY_COMPACT_BATCH - 1
+
+
+def load_chat_memory(session_id: str) -> Tuple[List[BaseMessage], int]:
+    """History to send with the next question, and its token count.
+
+    Returns the stored rolling summary plus the newest turns that fit the
+    token budget, including aged-out turns still waiting for their batch to
+    be compacted. Never calls the LLM; compaction runs after the response.
+    """
+    stored = get_session_summary(session_id)
+    turns = get_chat_turns(session_id, after_id=stored["summarized_through"])
+
+    messages = _summary_messages(stored["summary"])
+    summary_tokens = count_message_tokens(messages)
+
+    for turn in turns[_recent_window(turns, summary_tokens, _unsummarized_turns()):]:
+        messages.extend(_turn_messages(turn))
+    return messages, count_message_tokens(messages)
+
+
+def compact_chat_memory(session_id: str):
+    """Fold turns that have aged out of the verbatim window into the summary.
+
+    Runs only once ``CHAT_MEMORY_COMPACT_BATCH`` turns have aged out, or
+    sooner if the token budget would otherwise drop unsummarized turns.
+    Each turn is summarized exactly once; the summary row remembers the id
+    of the last turn it covers.
+    """
+    with _session_lock(session_id):
+        stored = get_session_summary(session_id)
+        turns = get_chat_turns(session_id, after_id=stored["summarized_through"])
+        summary_tokens = count_message_tokens(_summary_messages(stored["summary"]))
+        aged_out = turns[:_recent_window(turns, summary_tokens)]
+        if not aged_out:
+            return
+        if len(aged_out) < CHAT_MEMORY_COMPACT_BATCH and _recent_window(turns, summary_tokens, _unsummarized_turns()) == 0:
+            return
+
+        transcript = "\n".join(f"User: {turn['user_query']}\nAssistant: {turn['gpt_response']}" for turn in aged_out)
+        try:
+            messages = summary_update_prompt.format_messages(summary=stored["summary"] or "(none yet)", turns=transcript)
+            with routed(route_chat_memory()) as model_name:
+                summary = output_parser.invoke(model_pool.invoke(model_name, messages))
+        except Exception as e:
+            logging.error(f"Session ID: {session_id}, failed to update chat summary: {e}")
+            return
+        upsert_session_summary(session_id, summary, aged_out[-1]['id'])
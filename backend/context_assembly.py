@@ -0,0 +1,168 @@
+import os
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from langchain_core.documents import Document
+
+from backend.db_utils import get_document_filenames
+from backend.token_utils import count_tokens, truncate_tokens
+
+
+# Chunks retrieved per question before merging, de-duplication and packing.
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "8"))
+# Upper bound on retrieved-context tokens sent to the LLM.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+# Passages at least this similar (word Jaccard) to one already chosen are dropped.
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+# MMR trade-off between retrieval rank (1.0) and novelty (0.0).
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+# Chunks without start_index offsets are only stitched on a shared run of at least this
+# many characters (the splitter overlaps up to 200); a shorter match is likely accidental,
+# so the chunks are joined whole instead.
+MIN_OVERLAP_CHARS = 40
+MAX_OVERLAP_CHARS = 400
+# A passage is only truncated to fit if at least this many tokens are left.
+MIN_TRUNCATED_TOKENS = 100
+
+
+@dataclass
+class Passage:
+    file_id: Optional[int]
+    page: Optional[int]
+    first_chunk: Optional[int]
+    last_chunk: Optional[int]
+    text: str
+    rank: int
+    # Offset of the text in its page, when the splitter recorded one
+    start: Optional[int] = None
+    words: set = field(default_factory=set)
+
+
+@dataclass
+class AssembledContext:
+    text: str
+    sources: List[dict]
+    retrieved_tokens: int
+    context_tokens: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.retrieved_tokens - self.context_tokens)
+
+
+def _int_or_none(value):
+    return int(value) if value is not None else None
+
+
+def _stitch(left: Passage, right: Passage) -> str:
+    """Join two neighbouring chunks, writing the text they share only once."""
+    if left.start is not None and right.start is not None:
+        overlap = left.start + len(left.text) - right.start
+        if overlap <= 0:
+            return f"{left.text} {right.text}"
+        return left.text + right.text[overlap:]
+    for size in range(min(len(left.text), len(right.text), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        if left.text.endswith(right.text[:size]):
+            return left.text + right.text[size:]
+    return f"{left.text} {right.text}"
+
+
+def merge_adjacent(docs: List[Document]) -> List[Passage]:
+    """Merge consecutive chunks of the same file and page into single passages.
+
+    A merged passage takes the best retrieval rank of its chunks.
+    """
+    passages = [
+        Passage(_int_or_none(doc.metadata.get('file_id')), _int_or_none(doc.metadata.get('page')),
+                _int_or_none(doc.metadata.get('chunk_no')), _int_or_none(doc.metadata.get('chunk_no')),
+                doc.page_content, rank, _int_or_none(doc.metadata.get('start_index')))
+        for rank, doc in enumerate(docs)
+    ]
+    passages.sort(key=lambda p: (p.file_id is None, p.file_id or 0, p.page or 0,
+                                 p.first_chunk if p.first_chunk is not None else p.rank))
+    merged: List[Passage] = []
+    for passage in passages:
+        previous = merged[-1] if merged else None
+        if (previous is not None and passage.first_chunk is not None and previous.last_chunk is not None
+                and (previous.file_id, previous.page) == (passage.file_id, passage.page)
+                and passage.first_chunk <= previous.last_chunk + 1):
+            if passage.first_chunk > previous.last_chunk:
+                previous.text = _stitch(previous, passage)
+                previous.last_chunk = passage.last_chunk
+            previous.rank = min(previous.rank, passage.rank)
+            continue
+        merged.append(passage)
+    return merged
+
+
+def _words(text: str) -> set:
+    return set(re.findall(r"\w+", text.lower()))
+
+
+def _jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def select_diverse(passages: List[Passage]) -> List[Passage]:
+    """Greedy MMR over retrieval rank and word overlap, dropping near-duplicates."""
+    for passage in passages:
+        passage.words = _words(passage.text)
+    remaining = sorted(passages, key=lambda p: p.rank)
+    total = remaining[-1].rank + 1 if remaining else 1
+    selected: List[Passage] = []
+    while remaining:
+        best, best_score = None, None
+        for passage in list(remaining):
+            similarity = max((_jaccard(passage.words, chosen.words) for chosen in selected), default=0.0)
+            if similarity >= CONTEXT_DEDUP_THRESHOLD:
+                remaining.remove(passage)
+                continue
+            relevance = 1.0 - passage.rank / total
+            score = CONTEXT_MMR_LAMBDA * relevance - (1 - CONTEXT_MMR_LAMBDA) * similarity
+            if best_score is None or score > best_score:
+                best, best_score = passage, score
+        if best is None:
+            break
+        selected.append(best)
+        remaining.remove(best)
+    return selected
+
+
+def _attribution(passage: Passage, filenames: dict) -> str:
+    source = filenames.get(passage.file_id, "unknown document")
+    if passage.page is not None:
+        return f"[Source: {source}, page {passage.page + 1}]"
+    return f"[Source: {source}]"
+
+
+def assemble_context(docs: List[Document], token_budget: int = CONTEXT_TOKEN_BUDGET) -> AssembledContext:
+    """Turn retrieved chunks into the context block sent to the LLM.
+
+    Neighbouring chunks are stitched together without their overlap,
+    near-duplicates are dropped, and passages are packed in MMR order
+    until ``token_budget`` is reached. Each passage is labelled with its
+    source file and page.
+    """
+    retrieved_tokens = count_tokens("\n\n".join(doc.page_content for doc in docs))
+    passages = select_diverse(merge_adjacent(docs))
+    filenames = get_document_filenames([p.file_id for p in passages if p.file_id is not None]) if passages else {}
+
+    blocks, sources, used = [], [], 0
+    for passage in passages:
+        attribution = _attribution(passage, filenames)
+        block = f"{attribution}\n{passage.text}"
+        tokens = count_tokens(block)
+        if used + tokens > token_budget:
+            left = token_budget - used - count_tokens(attribution) - 1
+            if left < MIN_TRUNCATED_TOKENS:
+                continue
+            block = f"{attribution}\n{truncate_tokens(passage.text, left)}"
+            tokens = count_tokens(block)
+        blocks.append(block)
+        sources.append({"file_id": passage.file_id, "filename": filenames.get(passage.file_id), "page": passage.page,
+                        "chunks": [passage.first_chunk, passage.last_chunk]})
+        used += tokens
+
+    text = "\n\n".join(blocks)
+    return AssembledContext(text=text, sources=sources, retrieved_tokens=retrieved_tokens, context_tokens=count_tokens(text))
@@ -1,93 +1,427 @@
+import json
+import os
 import sqlite3
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 
 
-DB_NAME = "research_assistant.db"
+DB_NAME = os.getenv("DB_NAME", "research_assistant.db")
+
+# Each thread keeps one open connection instead of reconnecting per call.
+# WAL lets readers run alongside a writer, so concurrent requests don't
+# serialize on the database lock.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-20000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+)
+
+_local = threading.local()
+_schema_ready = False
+_schema_lock = threading.Lock()
 
 def get_db_connection():
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(DB_NAME, timeout=30)
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        _local.conn = conn
+        if not _schema_ready:
+            # Tables are created by the first connection rather than at import
+            try:
+                _create_schema()
+            except Exception:
+                _local.conn = None
+                conn.close()
+                raise
     return conn
 
-def create_application_logs():
+@contextmanager
+def transaction():
     conn = get_db_connection()
-    conn.execute('''CREATE TABLE IF NOT EXISTS application_logs
-                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                     session_id TEXT,
-                     user_query TEXT,
-                     gpt_response TEXT,
-                     model TEXT,
-                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-    conn.close()
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def create_application_logs():
+    with transaction() as conn:
+        conn.execute('''CREATE TABLE IF NOT EXISTS application_logs
+                        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                         session_id TEXT,
+                         user_query TEXT,
+                         gpt_response TEXT,
+                         model TEXT,
+                         timings TEXT,
+                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+        # Per-stage latencies of the request as JSON ({stage: seconds})
+        add_missing_column(conn, 'application_logs', 'timings', 'TEXT')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_application_logs_session ON application_logs (session_id, created_at)')
 
 def create_document_store():
+    with transaction() as conn:
+        conn.execute('''CREATE TABLE IF NOT EXISTS document_store
+                        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                         session_id TEXT,
+                         filename TEXT,
+                         content TEXT,
+                         upload_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                         chunk_count INTEGER,
+                         vector_namespace TEXT,
+                         content_hash TEXT,
+                         canonical_id INTEGER,
+                         deterministic_ids INTEGER)''')
+        add_missing_column(conn, 'document_store', 'chunk_count', 'INTEGER')
+        # NULL means the vectors still live in the shared default namespace
+        add_missing_column(conn, 'document_store', 'vector_namespace', 'TEXT')
+        # A re-upload of known content links to the row owning the content and vectors
+        add_missing_column(conn, 'document_store', 'content_hash', 'TEXT')
+        add_missing_column(conn, 'document_store', 'canonical_id', 'INTEGER')
+        # 1 when the vectors are stored as {file_id}-{chunk_no}; NULL rows may hold random legacy ids
+        add_missing_column(conn, 'document_store', 'deterministic_ids', 'INTEGER')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_document_store_session ON document_store (session_id, upload_timestamp)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_document_store_hash ON document_store (content_hash)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_document_store_canonical ON document_store (canonical_id)')
+
+def add_missing_column(conn, table, column, definition):
+    # Lightweight migration for databases created before the column existed
+    columns = [row['name'] for row in conn.execute(f'PRAGMA table_info({table})')]
+    if column not in columns:
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+def create_ingestion_jobs():
+    with transaction() as conn:
+        conn.execute('''CREATE TABLE IF NOT EXISTS ingestion_jobs
+                        (id TEXT PRIMARY KEY,
+                         session_id TEXT,
+                         filename TEXT,
+                         file_path TEXT,
+                         status TEXT DEFAULT 'queued',
+                         file_id INTEGER,
+                         content_hash TEXT,
+                         pages_parsed INTEGER DEFAULT 0,
+                         pages_total INTEGER,
+                         chunks_embedded INTEGER DEFAULT 0,
+                         summary_ready INTEGER DEFAULT 0,
+                         summary TEXT,
+                         error TEXT,
+                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                         updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+        add_missing_column(conn, 'ingestion_jobs', 'pages_total', 'INTEGER')
+        add_missing_column(conn, 'ingestion_jobs', 'content_hash', 'TEXT')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_status ON ingestion_jobs (status)')
+
+def create_session_summaries():
+    with transaction() as conn:
+        conn.execute('''CREATE TABLE IF NOT EXISTS session_summaries
+                        (session_id TEXT PRIMARY KEY,
+                         summary TEXT,
+                         summarized_through INTEGER DEFAULT 0,
+                         updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+
+def create_document_artifacts():
+    with transaction() as conn:
+        conn.execute('''CREATE TABLE IF NOT EXISTS document_artifacts
+                        (content_hash TEXT,
+                         artifact_type TEXT,
+                         model TEXT,
+                         prompt_version INTEGER,
+                         payload TEXT,
+                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                         PRIMARY KEY (content_hash, artifact_type, model, prompt_version))''')
+
+def create_indexed_chunks():
+    with transaction() as conn:
+        # Chunks of a document whose vectors are already stored; lets a failed upload resume
+        conn.execute('''CREATE TABLE IF NOT EXISTS indexed_chunks
+                        (file_id INTEGER,
+                         chunk_no INTEGER,
+                         PRIMARY KEY (file_id, chunk_no)) WITHOUT ROWID''')
+
+def create_chunk_index():
+    with transaction() as conn:
+        # Chunk text for keyword search; FTS5 indexes it without storing a second copy
+        conn.execute('''CREATE TABLE IF NOT EXISTS document_chunks
+                        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                         file_id INTEGER,
+                         chunk_no INTEGER,
+                         page INTEGER,
+                         text TEXT,
+                         start_index INTEGER,
+                         UNIQUE (file_id, chunk_no))''')
+        add_missing_column(conn, 'document_chunks', 'start_index', 'INTEGER')
+        # file_id is indexed too, so a scoped search filters inside the MATCH instead of after it
+        fts_columns = [row['name'] for row in conn.execute('PRAGMA table_info(chunk_fts)')]
+        rebuild = bool(fts_columns) and 'file_id' not in fts_columns
+        if rebuild:
+            conn.execute('DROP TRIGGER IF EXISTS document_chunks_ai')
+            conn.execute('DROP TRIGGER IF EXISTS document_chunks_ad')
+            conn.execute('DROP TABLE chunk_fts')
+        conn.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS chunk_fts
+                        USING fts5(text, file_id, content='document_chunks', content_rowid='id', tokenize='porter unicode61')''')
+        conn.execute('''CREATE TRIGGER IF NOT EXISTS document_chunks_ai AFTER INSERT ON document_chunks BEGIN
+                            INSERT INTO chunk_fts (rowid, text, file_id) VALUES (new.id, new.text, new.file_id);
+                        END''')
+        conn.execute('''CREATE TRIGGER IF NOT EXISTS document_chunks_ad AFTER DELETE ON document_chunks BEGIN
+                            INSERT INTO chunk_fts (chunk_fts, rowid, text, file_id) VALUES ('delete', old.id, old.text, old.file_id);
+                        END''')
+        if rebuild:
+            conn.execute("INSERT INTO chunk_fts (chunk_fts) VALUES ('rebuild')")
+
+def insert_application_logs(session_id, user_query, gpt_response, model, timings=None):
+    with transaction() as conn:
+        conn.execute('INSERT INTO application_logs (session_id, user_query, gpt_response, model, timings) VALUES (?, ?, ?, ?, ?)',
+                     (session_id, user_query, gpt_response, model, json.dumps(timings) if timings is not None else None))
+
+def get_chat_turns(session_id, after_id=0):
     conn = get_db_connection()
-    conn.execute('''CREATE TABLE IF NOT EXISTS document_store
-                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                     session_id TEXT,
-                     filename TEXT,
-                     content TEXT,
-                     upload_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-    conn.close()
-
-def insert_application_logs(session_id, user_query, gpt_response, model):
+    cursor = conn.cursor()
+    cursor.execute('SELECT id, user_query, gpt_response FROM application_logs WHERE session_id = ? AND id > ? ORDER BY created_at, id',
+                   (session_id, after_id))
+    return [dict(row) for row in cursor.fetchall()]
+
+def get_session_summary(session_id):
     conn = get_db_connection()
-    conn.execute('INSERT INTO application_logs (session_id, user_query, gpt_response, model) VALUES (?, ?, ?, ?)',
-                 (session_id, user_query, gpt_response, model))
-    conn.commit()
-    conn.close()
+    cursor = conn.cursor()
+    cursor.execute('SELECT summary, summarized_through FROM session_summaries WHERE session_id = ?', (session_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return {"summary": None, "summarized_through": 0}
+    return dict(row)
 
-def get_chat_history(session_id):
+def upsert_session_summary(session_id, summary, summarized_through):
+    with transaction() as conn:
+        conn.execute('''INSERT INTO session_summaries (session_id, summary, summarized_through) VALUES (?, ?, ?)
+                        ON CONFLICT(session_id) DO UPDATE SET summary = excluded.summary,
+                            summarized_through = excluded.summarized_through,
+                            updated_at = CURRENT_TIMESTAMP''',
+                     (session_id, summary, summarized_through))
+
+def insert_document_record(session_id, filename, content, content_hash=None):
+    with transaction() as conn:
+        cursor = conn.execute('INSERT INTO document_store (session_id, filename, content, vector_namespace, content_hash, deterministic_ids) VALUES (?, ?, ?, ?, ?, 1)',
+                              (session_id, filename, content, session_id, content_hash))
+        file_id = cursor.lastrowid
+    return file_id
+
+def link_document_record(session_id, filename, content_hash):
+    """Add a document to the session by linking to fully indexed content with the same hash.
+
+    Returns the new file_id, or None if no such content exists yet.
+    """
+    with transaction() as conn:
+        cursor = conn.execute('''INSERT INTO document_store (session_id, filename, content, chunk_count, vector_namespace, content_hash, canonical_id, deterministic_ids)
+                                SELECT ?, ?, '', chunk_count, vector_namespace, content_hash, id, deterministic_ids FROM document_store
+                                WHERE content_hash = ? AND canonical_id IS NULL AND chunk_count IS NOT NULL
+                                ORDER BY id LIMIT 1''',
+                              (session_id, filename, content_hash))
+        return cursor.lastrowid if cursor.rowcount else None
+
+def release_document_record(file_id):
+    """Remove a document from its session.
+
+    A linked row is deleted outright. A row that owns content other rows
+    still link to is only detached from its session. Returns the id whose
+    vectors and row should now be purged, or None while links remain.
+    """
+    with transaction() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        row = conn.execute('SELECT canonical_id FROM document_store WHERE id = ?', (file_id,)).fetchone()
+        if row is None:
+            return file_id
+        owner = row['canonical_id'] or file_id
+        if row['canonical_id'] is not None:
+            conn.execute('DELETE FROM document_store WHERE id = ?', (file_id,))
+        else:
+            conn.execute('UPDATE document_store SET session_id = NULL WHERE id = ?', (file_id,))
+        links = conn.execute('SELECT COUNT(*) FROM document_store WHERE canonical_id = ?', (owner,)).fetchone()[0]
+        owner_row = conn.execute('SELECT session_id FROM document_store WHERE id = ?', (owner,)).fetchone()
+        if links or (owner_row is not None and owner_row['session_id'] is not None):
+            return None
+        # Nothing references the content any more; keep new uploads from linking to it
+        conn.execute('UPDATE document_store SET content_hash = NULL WHERE id = ?', (owner,))
+        return owner
+
+def insert_document_records(records):
+    """Insert many (session_id, filename, content, content_hash) rows in one transaction and return their ids."""
+    file_ids = []
+    with transaction() as conn:
+        for session_id, filename, content, content_hash in records:
+            cursor = conn.execute('INSERT INTO document_store (session_id, filename, content, vector_namespace, content_hash, deterministic_ids) VALUES (?, ?, ?, ?, ?, 1)',
+                                  (session_id, filename, content, session_id, content_hash))
+            file_ids.append(cursor.lastrowid)
+    return file_ids
+
+def update_document_content(file_id, content, chunk_count=None):
+    with transaction() as conn:
+        conn.execute('UPDATE document_store SET content = ?, chunk_count = ? WHERE id = ?', (content, chunk_count, file_id))
+
+def get_document_index_info(file_id):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT session_id, chunk_count, vector_namespace, deterministic_ids FROM document_store WHERE id = ?', (file_id,))
+    row = cursor.fetchone()
+    return dict(row) if row is not None else None
+
+def get_retrieval_scope(session_id, file_id=None):
+    """Map each vector namespace to the file ids a query may search in it.
+
+    Linked documents resolve to the row that owns their vectors.
+    """
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute('SELECT user_query, gpt_response FROM application_logs WHERE session_id = ? ORDER BY created_at', (session_id,))
-    messages = []
+    query = '''SELECT COALESCE(d.canonical_id, d.id) AS id,
+                      CASE WHEN d.canonical_id IS NULL THEN d.vector_namespace ELSE c.vector_namespace END AS vector_namespace
+               FROM document_store d LEFT JOIN document_store c ON c.id = d.canonical_id'''
+    if file_id is not None:
+        cursor.execute(query + ' WHERE d.id = ?', (file_id,))
+    else:
+        cursor.execute(query + ' WHERE d.session_id = ?', (session_id,))
+    scope = {}
     for row in cursor.fetchall():
-        messages.append(HumanMessage(content=row['user_query']))
-        messages.append(AIMessage(content=row['gpt_response']))
+        file_ids = scope.setdefault(row['vector_namespace'] or "", [])
+        if row['id'] not in file_ids:
+            file_ids.append(row['id'])
+    return scope
+
+def get_scope_file_ids(session_id, file_id=None):
+    return [doc_id for file_ids in get_retrieval_scope(session_id, file_id).values() for doc_id in file_ids]
 
-    conn.close()
-    return messages
-def insert_document_record(session_id, filename, content):
+def get_documents_in_default_namespace():
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute('INSERT INTO document_store (session_id, filename, content) VALUES (?, ?, ?)', 
-                   (session_id, filename, content))
-    file_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    return file_id
+    cursor.execute('SELECT id, session_id, chunk_count, deterministic_ids FROM document_store WHERE vector_namespace IS NULL AND canonical_id IS NULL')
+    documents = cursor.fetchall()
+    return [dict(doc) for doc in documents]
+
+def set_document_namespace(file_id, vector_namespace):
+    with transaction() as conn:
+        conn.execute('UPDATE document_store SET vector_namespace = ? WHERE id = ?', (vector_namespace, file_id))
 
 def delete_document_record(file_id):
-    conn = get_db_connection()
-    conn.execute('DELETE FROM document_store WHERE id = ?', (file_id,))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute('DELETE FROM document_store WHERE id = ?', (file_id,))
+        conn.execute('DELETE FROM indexed_chunks WHERE file_id = ?', (file_id,))
+        conn.execute('DELETE FROM document_chunks WHERE file_id = ?', (file_id,))
     return True
 
+def mark_chunks_indexed(file_id, chunks):
+    """Record (chunk_no, page, text, start_index) rows whose vectors are stored and add them to the keyword index."""
+    with transaction() as conn:
+        conn.executemany('INSERT OR IGNORE INTO document_chunks (file_id, chunk_no, page, text, start_index) VALUES (?, ?, ?, ?, ?)',
+                         [(file_id, chunk_no, page, text, start_index) for chunk_no, page, text, start_index in chunks])
+        conn.executemany('INSERT OR IGNORE INTO indexed_chunks (file_id, chunk_no) VALUES (?, ?)',
+                         [(file_id, chunk_no) for chunk_no, _, _, _ in chunks])
+
+def search_chunks(match_query, file_ids, k):
+    """Top-k chunks of ``file_ids`` for an FTS5 MATCH expression over their text, best BM25 score first."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    # The file ids are part of the MATCH, so FTS5 only walks postings of the scoped documents
+    scope = " OR ".join(f'"{int(file_id)}"' for file_id in file_ids)
+    cursor.execute('''SELECT c.file_id, c.chunk_no, c.page, c.start_index, c.text, bm25(chunk_fts, 1.0, 0.0) AS score
+                      FROM chunk_fts JOIN document_chunks c ON c.id = chunk_fts.rowid
+                      WHERE chunk_fts MATCH ?
+                      ORDER BY score LIMIT ?''', (f"file_id : ({scope}) AND text : ({match_query})", k))
+    return [dict(row) for row in cursor.fetchall()]
+
+def get_indexed_chunks(file_id):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT chunk_no FROM indexed_chunks WHERE file_id = ?', (file_id,))
+    return {row['chunk_no'] for row in cursor.fetchall()}
+
+def clear_indexed_chunks(file_id):
+    with transaction() as conn:
+        conn.execute('DELETE FROM indexed_chunks WHERE file_id = ?', (file_id,))
+
+def get_document_filenames(file_ids):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    placeholders = ", ".join("?" for _ in file_ids)
+    cursor.execute(f'SELECT id, filename FROM document_store WHERE id IN ({placeholders})', tuple(file_ids))
+    return {row['id']: row['filename'] for row in cursor.fetchall()}
+
 def get_all_documents(session_id):
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute('SELECT id, filename, upload_timestamp FROM document_store WHERE session_id = ? ORDER BY upload_timestamp DESC', (session_id,))
     documents = cursor.fetchall()
-    conn.close()
     return [dict(doc) for doc in documents]
 
 
 def get_file_content(file_id: int) -> str | None:
     conn = get_db_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute('SELECT content FROM document_store WHERE id = ?', (file_id,))
-        row = cursor.fetchone()
-        if row is not None:
-            return row[0]  
-        return None
-    finally:
-        conn.close()
-
-
-# Initialize the database tables
-create_application_logs()
-create_document_store()
+    cursor = conn.cursor()
+    cursor.execute('''SELECT COALESCE(c.content, d.content) FROM document_store d
+                      LEFT JOIN document_store c ON c.id = d.canonical_id WHERE d.id = ?''', (file_id,))
+    row = cursor.fetchone()
+    if row is not None:
+        return row[0]  
+    return None
+
+
+def insert_ingestion_job(job_id, session_id, filename, file_path, content_hash=None, file_id=None):
+    with transaction() as conn:
+        conn.execute('INSERT INTO ingestion_jobs (id, session_id, filename, file_path, content_hash, file_id) VALUES (?, ?, ?, ?, ?, ?)',
+                     (job_id, session_id, filename, file_path, content_hash, file_id))
+
+def update_ingestion_job(job_id, **fields):
+    columns = ", ".join(f"{column} = ?" for column in fields)
+    with transaction() as conn:
+        conn.execute(f'UPDATE ingestion_jobs SET {columns}, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+                     (*fields.values(), job_id))
+
+def get_ingestion_job(job_id):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM ingestion_jobs WHERE id = ?', (job_id,))
+    row = cursor.fetchone()
+    return dict(row) if row is not None else None
+
+def get_unfinished_ingestion_jobs():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM ingestion_jobs WHERE status IN ('queued', 'running', 'summarizing') ORDER BY created_at")
+    jobs = cursor.fetchall()
+    return [dict(job) for job in jobs]
+
+
+def get_artifact(content_hash, artifact_type, model, prompt_version):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT payload FROM document_artifacts WHERE content_hash = ? AND artifact_type = ? AND model = ? AND prompt_version = ?',
+                   (content_hash, artifact_type, model, prompt_version))
+    row = cursor.fetchone()
+    return row['payload'] if row is not None else None
+
+def put_artifact(content_hash, artifact_type, model, prompt_version, payload):
+    with transaction() as conn:
+        conn.execute('INSERT OR REPLACE INTO document_artifacts (content_hash, artifact_type, model, prompt_version, payload) VALUES (?, ?, ?, ?, ?)',
+                     (content_hash, artifact_type, model, prompt_version, payload))
+
+
+def _create_schema():
+    global _schema_ready
+    with _schema_lock:
+        if _schema_ready:
+            return
+        create_application_logs()
+        create_document_store()
+        create_ingestion_jobs()
+        create_session_summaries()
+        create_document_artifacts()
+        create_indexed_chunks()
+        create_chunk_index()
+        _schema_ready = True
+
+def ping_db():
+    get_db_connection().execute('SELECT 1').fetchone()
@@ -0,0 +1,141 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Callable, Dict, List, Union
+
+from langchain_core.embeddings import Embeddings
+
+
+class CachedEmbeddings(Embeddings):
+    """Content-addressed, SQLite-backed cache in front of an embedding model.
+
+    Entries are keyed by (model, dimensions, sha256(text)) and evicted in
+    least-recently-used order once ``max_entries`` is exceeded.
+    """
+
+    def __init__(self, underlying: Union[Embeddings, Callable[[], Embeddings]], model: str, dimensions: int,
+                 path: str = "embedding_cache.db", max_entries: int = 500000):
+        # A factory is called on first use, e.g. to defer building an API client
+        self._underlying = underlying if isinstance(underlying, Embeddings) else None
+        self._factory = None if isinstance(underlying, Embeddings) else underlying
+        self.model = model
+        self.dimensions = dimensions
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.path = path
+        self._conn = None
+        self._entries = 0
+
+    @property
+    def underlying(self) -> Embeddings:
+        if self._underlying is None:
+            with self._lock:
+                if self._underlying is None:
+                    self._underlying = self._factory()
+        return self._underlying
+
+    @underlying.setter
+    def underlying(self, value: Embeddings):
+        self._underlying = value
+
+    def ping(self):
+        with self._lock:
+            self._connect().execute('SELECT 1').fetchone()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Opened on first use so importing the module touches no files; callers hold self._lock
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''CREATE TABLE IF NOT EXISTS embeddings
+                            (key TEXT PRIMARY KEY,
+                             vector BLOB,
+                             last_used REAL)''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)')
+            conn.commit()
+            self._entries = conn.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    def _key(self, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{self.model}:{self.dimensions}:{digest}"
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            conn = self._connect()
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                for key, blob in conn.execute(
+                        f'SELECT key, vector FROM embeddings WHERE key IN ({placeholders})', batch):
+                    found[key] = array("f", blob).tolist()
+            if found:
+                now = time.time()
+                conn.executemany('UPDATE embeddings SET last_used = ? WHERE key = ?',
+                                 [(now, key) for key in found])
+                conn.commit()
+        return found
+
+    def _store(self, items: Dict[str, List[float]]):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            before = conn.total_changes
+            conn.executemany('INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)',
+                             [(key, array("f", vector).tobytes(), now) for key, vector in items.items()])
+            self._entries += conn.total_changes - before
+            if self._entries > self.max_entries:
+                # Evict down to 90% so we don't pay for an eviction on every insert.
+                excess = self._entries - int(self.max_entries * 0.9)
+                conn.execute('DELETE FROM embeddings WHERE key IN '
+                             '(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)', (excess,))
+                self._entries -= excess
+            conn.commit()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        cached = self._lookup(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+        miss_count = sum(1 for key in keys if key not in cached)
+        with self._lock:
+            self.hits += len(keys) - miss_count
+            self.misses += miss_count
+
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self._store(computed)
+            cached.update(computed)
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        cached = self._lookup([key])
+        with self._lock:
+            if key in cached:
+                self.hits += 1
+                return cached[key]
+            self.misses += 1
+        vector = self.underlying.embed_query(text)
+        self._store({key: vector})
+        return vector
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": self._entries,
+        }
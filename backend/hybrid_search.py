@@ -0,0 +1,194 @@
+import asyncio
+import functools
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Dict, List, Optional
+
+from langchain_core.documents import Document
+
+from backend.db_utils import search_chunks
+from backend.metrics import observe_stage, timed
+from backend.pinecone_utilis import embeddings, search_by_vector
+
+
+# hybrid fuses keyword and vector hits; vector or lexical use one side only.
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+# Hits taken from each side before fusion.
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "20"))
+# Reciprocal-rank fusion: score = sum(weight / (RRF_K + rank)).
+RRF_K = int(os.getenv("RRF_K", "60"))
+RRF_VECTOR_WEIGHT = float(os.getenv("RRF_VECTOR_WEIGHT", "1.0"))
+RRF_LEXICAL_WEIGHT = float(os.getenv("RRF_LEXICAL_WEIGHT", "1.0"))
+# A vector search slower than this is abandoned and keyword hits are used alone. After
+# VECTOR_FAILURE_THRESHOLD failures in a row (searches or query embeddings), the vector
+# side is skipped for VECTOR_RETRY_AFTER seconds.
+VECTOR_SEARCH_TIMEOUT = float(os.getenv("VECTOR_SEARCH_TIMEOUT", "2.0"))
+VECTOR_FAILURE_THRESHOLD = int(os.getenv("VECTOR_FAILURE_THRESHOLD", "3"))
+VECTOR_RETRY_AFTER = float(os.getenv("VECTOR_RETRY_AFTER", "30"))
+MAX_QUERY_TERMS = 32
+# Words this short or this common match most chunks and only add noise to the keyword OR
+MIN_TERM_LENGTH = 2
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being between both but by
+can could did do does doing down during each few for from further had has have having he her here hers him
+his how i if in into is it its itself just me more most my no nor not now of off on once only or other our
+ours out over own same she should so some such than that the their theirs them then there these they this
+those through to too under until up very was we were what when where which while who whom why will with
+would you your yours
+""".split())
+# Threads for the chat path's query embedding and retrieval, kept off the default
+# executor so uploads and other blocking I/O cannot queue ahead of them. Vector
+# searches get a pool of the same size, since each retrieval may wait on one.
+RETRIEVAL_WORKER_THREADS = int(os.getenv("RETRIEVAL_WORKER_THREADS", "32"))
+
+retrieval_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKER_THREADS, thread_name_prefix="retrieval")
+_search_pool = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKER_THREADS, thread_name_prefix="vector-search")
+_vector_down_until = 0.0
+_vector_failures = 0
+_vector_state_lock = threading.Lock()
+
+
+def _timed(timings: Dict[str, float], stage: str, fn, *args):
+    with timed(stage, timings):
+        return fn(*args)
+
+
+async def run_retrieval_work(fn, *args, **kwargs):
+    """Await blocking embedding or retrieval code, run on ``retrieval_executor``."""
+    return await asyncio.get_running_loop().run_in_executor(retrieval_executor, functools.partial(fn, *args, **kwargs))
+
+
+def fts_query(query: str) -> Optional[str]:
+    """OR of the query's content words, quoted so FTS5 operators in user text are taken literally."""
+    words = (term.lower() for term in re.findall(r"\w+", query))
+    terms = list(dict.fromkeys(word for word in words if len(word) >= MIN_TERM_LENGTH and word not in STOPWORDS))
+    terms = terms[:MAX_QUERY_TERMS]
+    return " OR ".join(f'"{term}"' for term in terms) if terms else None
+
+
+def lexical_search(query: str, file_ids: List[int], k: int) -> List[Document]:
+    match_query = fts_query(query)
+    if match_query is None or not file_ids:
+        return []
+    return [
+        Document(page_content=row['text'], metadata={'file_id': row['file_id'], 'chunk_no': row['chunk_no'], 'page': row['page'],
+                                                     'start_index': row['start_index']})
+        for row in search_chunks(match_query, file_ids, k)
+    ]
+
+
+def vector_search(scope: Dict[str, List[int]], k: int, query_vector: List[float],
+                  timings: Dict[str, float]) -> List[Document]:
+    hits = []
+    with timed("vector_search", timings):
+        for namespace, file_ids in scope.items():
+            hits.extend(search_by_vector(query_vector, k=k, namespace=namespace, file_ids=file_ids))
+        hits.sort(key=lambda hit: hit[1], reverse=True)
+    return [doc for doc, _ in hits[:k]]
+
+
+def _doc_key(doc: Document):
+    # Pinecone returns numeric metadata as floats
+    if doc.metadata.get('chunk_no') is not None:
+        return int(doc.metadata['file_id']), int(doc.metadata['chunk_no'])
+    return doc.page_content
+
+
+def rrf_fuse(ranked_lists: List[tuple], k: int) -> List[Document]:
+    """Merge (documents, weight) rankings by reciprocal-rank fusion and keep the top k."""
+    scores, docs = {}, {}
+    for ranked, weight in ranked_lists:
+        for rank, doc in enumerate(ranked, start=1):
+            key = _doc_key(doc)
+            scores[key] = scores.get(key, 0.0) + weight / (RRF_K + rank)
+            docs.setdefault(key, doc)
+    return [docs[key] for key in sorted(scores, key=scores.get, reverse=True)[:k]]
+
+
+def _vector_available() -> bool:
+    return time.monotonic() >= _vector_down_until
+
+
+def _record_vector_success():
+    global _vector_failures
+    with _vector_state_lock:
+        _vector_failures = 0
+
+
+def _record_vector_failure(reason: str):
+    global _vector_down_until, _vector_failures
+    with _vector_state_lock:
+        _vector_failures += 1
+        tripped = _vector_failures >= VECTOR_FAILURE_THRESHOLD
+        if tripped:
+            _vector_failures = 0
+            _vector_down_until = time.monotonic() + VECTOR_RETRY_AFTER
+    if tripped:
+        logging.warning(f"Vector search {reason}; using keyword search only for {VECTOR_RETRY_AFTER:.0f}s")
+    else:
+        logging.warning(f"Vector search {reason}")
+
+
+def embed_search_query(query: str, timings: Optional[Dict[str, float]] = None) -> Optional[List[float]]:
+    """Embedding of ``query`` for the vector side, or None when that side is off or the call fails."""
+    if RETRIEVAL_MODE == "lexical" or not _vector_available():
+        return None
+    try:
+        with timed("embed_query", timings):
+            return embeddings.embed_query(query)
+    except Exception as e:
+        _record_vector_failure(f"query embedding failed ({e})")
+        return None
+
+
+def hybrid_search(query: str, scope: Dict[str, List[int]], k: int = 4, query_vector: Optional[List[float]] = None,
+                  timings: Optional[Dict[str, float]] = None) -> List[Document]:
+    """Top-k chunks for ``query`` within ``scope`` ({namespace: file_ids}).
+
+    The query is embedded first unless ``query_vector`` is given. The
+    vector search then runs on a worker thread while the keyword search
+    runs here; the two rankings are fused with RRF. If the vector side
+    errors or its search exceeds ``VECTOR_SEARCH_TIMEOUT`` the keyword hits
+    are used alone. Stage latencies are written to ``timings``.
+    """
+    timings = {} if timings is None else timings
+    start = time.perf_counter()
+    file_ids = [file_id for ids in scope.values() for file_id in ids]
+
+    vector_future = None
+    if RETRIEVAL_MODE != "lexical" and _vector_available():
+        if query_vector is None:
+            query_vector = embed_search_query(query, timings)
+        if query_vector is not None:
+            # The timeout covers the search only, not the embedding call before it
+            search_start = time.perf_counter()
+            vector_future = _search_pool.submit(vector_search, scope, RETRIEVAL_CANDIDATES, query_vector, timings)
+
+    lexical_docs = []
+    if RETRIEVAL_MODE != "vector" or vector_future is None:
+        try:
+            lexical_docs = _timed(timings, "lexical_search", lexical_search, query, file_ids, RETRIEVAL_CANDIDATES)
+        except Exception as e:
+            logging.error(f"Keyword search failed: {e}")
+
+    vector_docs = []
+    if vector_future is not None:
+        try:
+            vector_docs = vector_future.result(timeout=max(0.0, VECTOR_SEARCH_TIMEOUT - (time.perf_counter() - search_start)))
+            _record_vector_success()
+        except FutureTimeoutError:
+            _record_vector_failure(f"took longer than {VECTOR_SEARCH_TIMEOUT}s")
+        except Exception as e:
+            _record_vector_failure(f"failed ({e})")
+        if not vector_docs and RETRIEVAL_MODE == "vector":
+            lexical_docs = _timed(timings, "lexical_search", lexical_search, query, file_ids, RETRIEVAL_CANDIDATES)
+
+    fused = _timed(timings, "fusion", rrf_fuse,
+                   [(vector_docs, RRF_VECTOR_WEIGHT), (lexical_docs, RRF_LEXICAL_WEIGHT)], k)
+    observe_stage("retrieval", time.perf_counter() - start, timings)
+    return fused
@@ -0,0 +1,199 @@
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+from email.utils import parsedate_to_datetime
+from typing import Callable, List, Optional
+
+import openai
+from langchain_core.documents import Document
+
+from backend.db_utils import mark_chunks_indexed
+from backend.metrics import observe_stage
+from backend.pinecone_utilis import embeddings, upsert_embeddings
+from backend.token_utils import count_tokens
+
+
+# One embedding request carries at most this many tokens / inputs
+# (the OpenAI limit is 300k tokens and 2048 inputs per request).
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "20000"))
+EMBED_BATCH_MAX_INPUTS = int(os.getenv("EMBED_BATCH_MAX_INPUTS", "256"))
+# Batches embedded and upserted at the same time for one document.
+INDEX_WORKERS = int(os.getenv("INDEX_WORKERS", "4"))
+INDEX_MAX_RETRIES = int(os.getenv("INDEX_MAX_RETRIES", "6"))
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+# Caps concurrent embedding calls across all uploads in this process.
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+embedding_slots = threading.BoundedSemaphore(EMBEDDING_CONCURRENCY)
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+class IndexingError(Exception):
+    """Some batches of a document could not be indexed after retrying.
+
+    The chunks that did make it are recorded, so running the document
+    through the pipeline again only embeds the missing ones.
+    """
+
+    def __init__(self, file_id: int, failed_chunks: List[int], chunks_indexed: int, cause: Exception):
+        super().__init__(f"{len(failed_chunks)} chunks of file_id {file_id} were not indexed: {cause}")
+        self.file_id = file_id
+        self.failed_chunks = failed_chunks
+        self.chunks_indexed = chunks_indexed
+
+
+def parse_reset_duration(value: str) -> Optional[float]:
+    """Seconds in an OpenAI reset header such as ``1s``, ``6m0s`` or ``20ms``."""
+    parts = _DURATION_PART.findall(value or "")
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """How long the server asked us to wait, if the error response says."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or getattr(error, "headers", None) or {}
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    resets = [parse_reset_duration(headers.get(name)) for name in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")]
+    resets = [reset for reset in resets if reset is not None]
+    return max(resets) if resets else None
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)):
+        return True
+    # Pinecone and httpx errors expose the HTTP status under one of these names
+    status = getattr(error, "status", None) or getattr(error, "status_code", None)
+    return status in RETRYABLE_STATUS
+
+
+def with_backoff(fn: Callable, *args, max_retries: int = INDEX_MAX_RETRIES):
+    """Call ``fn``, retrying transient failures with exponential backoff.
+
+    A rate-limit response's own retry-after / reset headers take precedence
+    over the computed delay.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return fn(*args)
+        except Exception as e:
+            if attempt == max_retries or not is_retryable(e):
+                raise
+            delay = retry_after_seconds(e)
+            if delay is None:
+                delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt) * random.uniform(0.5, 1.0)
+            delay = min(delay, BACKOFF_MAX_SECONDS)
+            logging.warning(f"{getattr(fn, '__name__', fn)} failed ({e}); retry {attempt + 1}/{max_retries} in {delay:.2f}s")
+            time.sleep(delay)
+
+
+class IndexingEngine:
+    """Embeds and upserts the chunks of one document over a pool of threads.
+
+    Chunks are grouped into batches bounded by token count and size; each
+    batch is embedded and upserted by a worker, so several batches are in
+    flight at once. Submitting blocks once ``2 * workers`` batches are
+    pending, which keeps memory flat for large documents. A batch that
+    still fails after backing off is recorded rather than aborting the
+    others; ``close`` raises ``IndexingError`` listing its chunks.
+    """
+
+    def __init__(self, file_id: int, namespace: str = "", workers: int = INDEX_WORKERS,
+                 on_batch: Optional[Callable[[], None]] = None):
+        self.file_id = file_id
+        self.namespace = namespace
+        self.on_batch = on_batch
+        self.chunks_indexed = 0
+        self.failed_chunks: List[int] = []
+        self.timings = defaultdict(float)
+        self._error: Optional[Exception] = None
+        self._batch: List[Document] = []
+        self._batch_tokens = 0
+        self._futures = []
+        self._lock = threading.Lock()
+        self._pending = threading.BoundedSemaphore(workers * 2)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="index")
+
+    def add(self, split: Document):
+        tokens = count_tokens(split.page_content)
+        if self._batch and (self._batch_tokens + tokens > EMBED_BATCH_TOKENS or len(self._batch) >= EMBED_BATCH_MAX_INPUTS):
+            self.flush()
+        self._batch.append(split)
+        self._batch_tokens += tokens
+
+    def flush(self):
+        if not self._batch:
+            return
+        batch, self._batch, self._batch_tokens = self._batch, [], 0
+        self._pending.acquire()
+        future = self._pool.submit(self._index_batch, batch)
+        future.add_done_callback(lambda _: self._pending.release())
+        self._futures.append(future)
+
+    def _timed(self, stage: str, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            observe_stage(f"index_{stage}_batch", elapsed)
+            with self._lock:
+                self.timings[stage] += elapsed
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        with embedding_slots:
+            return embeddings.embed_documents(texts)
+
+    def _index_batch(self, batch: List[Document]):
+        chunk_nos = [split.metadata['chunk_no'] for split in batch]
+        try:
+            vectors = self._timed("embed", with_backoff, self._embed, [split.page_content for split in batch])
+            self._timed("upsert", with_backoff, upsert_embeddings, batch, vectors, self.namespace)
+            mark_chunks_indexed(self.file_id, [(split.metadata['chunk_no'], split.metadata.get('page'), split.page_content,
+                                                split.metadata.get('start_index')) for split in batch])
+        except Exception as e:
+            logging.error(f"Indexing chunks {chunk_nos[0]}-{chunk_nos[-1]} of file_id {self.file_id} failed: {e}")
+            with self._lock:
+                self.failed_chunks.extend(chunk_nos)
+                self._error = self._error or e
+            return
+        with self._lock:
+            self.chunks_indexed += len(batch)
+        if self.on_batch:
+            self.on_batch()
+
+    def cancel(self):
+        """Drop batches that have not started and wait for the running ones."""
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def close(self):
+        """Flush the last batch, wait for every worker and report failures."""
+        try:
+            self.flush()
+            wait(self._futures)
+        finally:
+            self._pool.shutdown(wait=True)
+        if self.failed_chunks:
+            raise IndexingError(self.file_id, sorted(self.failed_chunks), self.chunks_indexed, self._error)
@@ -0,0 +1,142 @@
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional
+
+from langchain_core.documents import Document
+
+from backend.answer_cache import answer_cache
+from backend.db_utils import (clear_indexed_chunks, delete_document_record, get_indexed_chunks, get_scope_file_ids,
+                              insert_document_record, update_document_content)
+from backend.indexing_engine import IndexingEngine, IndexingError
+from backend.metrics import observe_stage
+from backend.pinecone_utilis import delete_doc_from_pinecone, get_document_loader, text_splitter
+
+
+@dataclass
+class IngestionResult:
+    file_id: int
+    splits: List[Document] = field(default_factory=list)
+    pages: int = 0
+    total_pages: int = 0
+    chunks_indexed: int = 0
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def content(self) -> str:
+        return "\n\n".join(split.page_content for split in self.splits)
+
+
+class IngestionPipeline:
+    """Parses an uploaded file once and streams it through the index.
+
+    Pages are loaded and split one at a time and the chunks are handed to
+    an ``IndexingEngine``, which embeds and upserts them in concurrent
+    batches. Chunks already recorded as indexed for ``file_id`` are
+    skipped, so re-running a partially failed upload only embeds what is
+    missing. The splits are kept (text only) for the SQLite record and the
+    summarizer.
+    """
+
+    def __init__(self, file_path: str, file_id: int, namespace: str = "",
+                 on_progress: Optional[Callable[[IngestionResult], None]] = None):
+        self.file_path = file_path
+        self.file_id = file_id
+        self.namespace = namespace
+        self.on_progress = on_progress
+        self.result = IngestionResult(file_id=file_id)
+        self._timings = defaultdict(float)
+
+    def _timed(self, stage: str, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self._timings[stage] += time.perf_counter() - start
+
+    def load_pages(self) -> Iterator[Document]:
+        pages = self._timed("load", lambda: iter(get_document_loader(self.file_path).lazy_load()))
+        while True:
+            page = self._timed("load", next, pages, None)
+            if page is None:
+                return
+            yield page
+
+    def split_page(self, page: Document) -> List[Document]:
+        splits = self._timed("split", text_splitter.split_documents, [page])
+        for split in splits:
+            split.metadata['file_id'] = self.file_id
+            split.metadata['chunk_no'] = len(self.result.splits)
+            self.result.splits.append(split)
+        return splits
+
+    def _report_progress(self):
+        if self.on_progress:
+            self.on_progress(self.result)
+
+    def _sync_indexed(self, engine: IndexingEngine, already_indexed: int):
+        self.result.chunks_indexed = already_indexed + engine.chunks_indexed
+        self._report_progress()
+
+    def run(self) -> IngestionResult:
+        start = time.perf_counter()
+        done = get_indexed_chunks(self.file_id)
+        engine = IndexingEngine(self.file_id, namespace=self.namespace,
+                                on_batch=lambda: self._sync_indexed(engine, len(done)))
+        self.result.chunks_indexed = len(done)
+        try:
+            for page in self.load_pages():
+                self.result.pages += 1
+                self.result.total_pages = max(self.result.pages, page.metadata.get("total_pages", 0))
+                for split in self.split_page(page):
+                    if split.metadata['chunk_no'] not in done:
+                        engine.add(split)
+                self._report_progress()
+        except BaseException:
+            engine.cancel()
+            raise
+        try:
+            engine.close()
+        finally:
+            self.result.chunks_indexed = len(done) + engine.chunks_indexed
+            self._timings.update(engine.timings)
+            self._timings["total"] = time.perf_counter() - start
+            observe_stage("upload_parse", self._timings["load"])
+            observe_stage("upload_split", self._timings["split"])
+            observe_stage("upload_index", self._timings["total"])
+            self.result.timings = {stage: round(seconds, 4) for stage, seconds in self._timings.items()}
+            # embed/upsert are summed over the workers, so throughput is the number to compare
+            self.result.timings["chunks_per_second"] = round(engine.chunks_indexed / self._timings["total"], 2)
+        return self.result
+
+
+def ingest_file(file_path: str, filename: str, session_id: str,
+                on_progress: Optional[Callable[[IngestionResult], None]] = None,
+                file_id: Optional[int] = None, keep_partial: bool = False,
+                content_hash: Optional[str] = None) -> IngestionResult:
+    """Create the document record and index the file into the session's namespace.
+
+    Pass the ``file_id`` of an earlier, partially indexed run to resume it.
+    If some chunks still fail, ``IndexingError`` is raised; with
+    ``keep_partial`` the record and the chunks that made it are kept so
+    the upload can be resumed, otherwise they are removed. Any other
+    failure removes them as well.
+    """
+    if file_id is None:
+        file_id = insert_document_record(session_id, filename, "", content_hash=content_hash)
+    try:
+        result = IngestionPipeline(file_path, file_id, namespace=session_id, on_progress=on_progress).run()
+    except IndexingError:
+        if not keep_partial:
+            delete_doc_from_pinecone(file_id)
+            delete_document_record(file_id)
+        raise
+    except Exception:
+        delete_doc_from_pinecone(file_id)
+        delete_document_record(file_id)
+        raise
+    update_document_content(file_id, result.content, chunk_count=len(result.splits))
+    clear_indexed_chunks(file_id)
+    # The session's document set changed, so answers computed over the old set are stale
+    answer_cache.invalidate_files(get_scope_file_ids(session_id))
+    return result
@@ -0,0 +1,167 @@
+import hashlib
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Tuple
+
+from backend.db_utils import get_document_index_info, get_ingestion_job, get_unfinished_ingestion_jobs, insert_ingestion_job, update_ingestion_job, delete_document_record, get_file_content
+from backend.indexing_engine import IndexingError
+from backend.metrics import timed
+from backend.ingestion import ingest_file
+from backend.summarization import summarize_document
+from backend.pinecone_utilis import delete_doc_from_pinecone
+
+
+# Uploads handed to the background workers are kept here until their job finishes.
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR", "uploads")
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+# Files of one /upload-docs request that are parsed and indexed at the same time. Across all
+# requests, embedding calls stay capped by EMBEDDING_CONCURRENCY and summary calls by
+# ModelPool's per-model LLM_MAX_CONCURRENCY.
+BATCH_UPLOAD_CONCURRENCY = int(os.getenv("BATCH_UPLOAD_CONCURRENCY", "8"))
+SPOOL_CHUNK_SIZE = 1024 * 1024
+
+executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+
+
+def spool_path(job_id: str, filename: str) -> str:
+    os.makedirs(UPLOAD_SPOOL_DIR, exist_ok=True)
+    return os.path.join(UPLOAD_SPOOL_DIR, f"{job_id}{os.path.splitext(filename)[1].lower()}")
+
+
+def new_job_id() -> str:
+    return str(uuid.uuid4())
+
+
+class UploadTooLargeError(Exception):
+    pass
+
+
+def spool_upload(source: BinaryIO, job_id: str, filename: str) -> Tuple[str, str]:
+    """Copy an upload to its own spool file in chunks, hashing it on the way.
+
+    Returns (path, sha256 hex digest). Raises ``UploadTooLargeError`` and
+    removes the partial file once more than ``MAX_UPLOAD_BYTES`` arrive.
+    """
+    path = spool_path(job_id, filename)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(path, "wb") as buffer:
+            while chunk := source.read(SPOOL_CHUNK_SIZE):
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise UploadTooLargeError(f"{filename} is larger than {MAX_UPLOAD_BYTES} bytes")
+                digest.update(chunk)
+                buffer.write(chunk)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return path, digest.hexdigest()
+
+
+def submit_ingestion_job(job_id: str, file_path: str, filename: str, session_id: str, content_hash: str = None,
+                         file_id: int = None) -> str:
+    """Queue a spooled upload for indexing; ``file_id`` is a document record created up front, if any."""
+    insert_ingestion_job(job_id, session_id, filename, file_path, content_hash=content_hash, file_id=file_id)
+    executor.submit(run_ingestion_job, job_id)
+    return job_id
+
+
+def submit_linked_job(job_id: str, filename: str, session_id: str, file_id: int) -> str:
+    """Job record for an upload that was linked to existing content; only the summary may be missing."""
+    insert_ingestion_job(job_id, session_id, filename, "")
+    update_ingestion_job(job_id, status="summarizing", file_id=file_id)
+    executor.submit(run_summary_job, job_id, get_file_content(file_id))
+    return job_id
+
+
+def keep_failed_upload(job_id: str, file_path: str, filename: str, session_id: str, content_hash: str,
+                       error: IndexingError):
+    """Record a synchronous upload that indexed only part of its file as a failed job.
+
+    The spooled file and the chunks that made it stay, so ``retry_ingestion_job``
+    resumes the upload like a background one.
+    """
+    insert_ingestion_job(job_id, session_id, filename, file_path, content_hash=content_hash, file_id=error.file_id)
+    update_ingestion_job(job_id, status="failed", chunks_embedded=error.chunks_indexed, error=str(error))
+
+
+def run_ingestion_job(job_id: str):
+    job = get_ingestion_job(job_id)
+    if job is None:
+        return
+    file_path = job["file_path"]
+    # A job that indexed part of its file before failing picks up where it stopped
+    file_id = job["file_id"] if job["file_id"] is not None and get_document_index_info(job["file_id"]) else None
+
+    def report_progress(result):
+        update_ingestion_job(job_id, file_id=result.file_id, pages_parsed=result.pages,
+                             pages_total=result.total_pages, chunks_embedded=result.chunks_indexed)
+
+    try:
+        update_ingestion_job(job_id, status="running", error=None)
+        result = ingest_file(file_path, job["filename"], job["session_id"], on_progress=report_progress,
+                             file_id=file_id, keep_partial=True, content_hash=job["content_hash"])
+        update_ingestion_job(job_id, status="summarizing", file_id=result.file_id, pages_parsed=result.pages,
+                             chunks_embedded=result.chunks_indexed)
+        logging.info(f"Job {job_id} indexed file_id {result.file_id}, timings {result.timings}")
+
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        run_summary_job(job_id, result.content)
+    except IndexingError as e:
+        # The spooled file and the indexed chunks are kept for retry_ingestion_job
+        logging.error(f"Ingestion job {job_id} failed: {e}")
+        update_ingestion_job(job_id, status="failed", file_id=e.file_id, chunks_embedded=e.chunks_indexed, error=str(e))
+    except Exception as e:
+        logging.error(f"Ingestion job {job_id} failed: {e}")
+        update_ingestion_job(job_id, status="failed", file_id=None, error=str(e))
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+
+def retry_ingestion_job(job_id: str) -> bool:
+    """Re-queue a failed job whose upload is still spooled; only missing chunks are embedded."""
+    job = get_ingestion_job(job_id)
+    if job is None or job["status"] != "failed" or not os.path.exists(job["file_path"]):
+        return False
+    update_ingestion_job(job_id, status="queued")
+    executor.submit(run_ingestion_job, job_id)
+    return True
+
+
+def run_summary_job(job_id: str, docs_content: str):
+    try:
+        with timed("upload_summary"):
+            summary = summarize_document(docs_content)
+        update_ingestion_job(job_id, status="completed", summary=summary, summary_ready=1)
+    except Exception as e:
+        logging.error(f"Summary for job {job_id} failed: {e}")
+        update_ingestion_job(job_id, status="failed", error=str(e))
+
+
+def resume_ingestion_jobs():
+    """Re-queue jobs that were interrupted by a restart.
+
+    Chunks a half-finished run already indexed are kept; the job resumes
+    from the spooled file and only embeds what is missing.
+    """
+    for job in get_unfinished_ingestion_jobs():
+        if job["status"] == "summarizing":
+            # Indexing finished before the restart; only the summary is missing.
+            content = get_file_content(job["file_id"])
+            if content is not None:
+                executor.submit(run_summary_job, job["id"], content)
+                continue
+        if not os.path.exists(job["file_path"]):
+            if job["file_id"] is not None:
+                delete_doc_from_pinecone(job["file_id"])
+                delete_document_record(job["file_id"])
+            update_ingestion_job(job["id"], status="failed", file_id=None, error="Upload was lost during a restart")
+            continue
+        update_ingestion_job(job["id"], status="queued")
+        executor.submit(run_ingestion_job, job["id"])
@@ -1,21 +1,16 @@
-from langchain_openai import ChatOpenAI
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langgraph.graph import START, StateGraph
 from langchain_core.messages import HumanMessage, AIMessage, BaseMessage, SystemMessage
-from typing import List
-from typing_extensions import List, TypedDict
+from typing import AsyncIterator, Dict, List, Optional
+from typing_extensions import List, NotRequired, TypedDict
 from langchain_core.documents import Document
-import os
-from backend.pinecone_utilis import vectorstore
-from dotenv import load_dotenv
-load_dotenv()
-OPENAI_API_KEY=os.getenv("OPENAI_API_KEY")
-retriever = vectorstore.as_retriever(search_kwargs={"k": 4})
-llm = ChatOpenAI(
-    model='gpt-4.1',
-    api_key=OPENAI_API_KEY
-)
+from backend.hybrid_search import hybrid_search, run_retrieval_work
+from backend.context_assembly import CONTEXT_CANDIDATES, assemble_context
+from backend.db_utils import get_retrieval_scope
+from backend.llm_clients import model_pool
+from backend.metrics import timed
+from backend.model_router import route_answer, route_condense, routed
+from backend.pydantic_models import ModelName
 output_parser = StrOutputParser()
 
 contextualize_q_system_prompt = (
@@ -41,30 +36,77 @@ qa_prompt = ChatPromptTemplate.from_messages([
 
 class State(TypedDict):
     messages: List[BaseMessage]
+    timings: NotRequired[Dict[str, float]]
+    context_tokens_saved: NotRequired[int]
+    context_tokens: NotRequired[int]
+    context_documents: NotRequired[int]
+    routed_model: NotRequired[str]
     
 
 
 # Define application steps
-def retrieve(query: str):
-    retrieved_docs = vectorstore.similarity_search(query)
-    return  retrieved_docs
+async def condense_question(query: str, chat_history: List[BaseMessage], model: Optional[ModelName] = None) -> str:
+    # Follow-ups are rewritten so retrieval and the answer cache see a self-contained question
+    if not chat_history:
+        return query
+    messages = contextualize_q_prompt.format_messages(chat_history=chat_history, input=query)
+    with routed(route_condense(model)) as model_name:
+        response = await model_pool.ainvoke(model_name, messages)
+    return output_parser.invoke(response)
+
+
+def retrieve(query: str, session_id: str = None, file_id: int = None, k: int = 4, query_vector: List[float] = None,
+             timings: Dict[str, float] = None):
+    # Only the session's own documents (or the selected file) are searched
+    scope = get_retrieval_scope(session_id, file_id)
+    if not scope:
+        return []
+    return hybrid_search(query, scope, k=k, query_vector=query_vector, timings=timings)
 
 
-def generate_response(query: str, state: State)->State:
-    retrieved_docs=retrieve(query=query)
-    docs_content = "\n\n".join(doc.page_content for doc in retrieved_docs)
+def add_context_messages(query: str, state: State, session_id: str = None, file_id: int = None,
+                         retrieval_query: str = None, query_vector: List[float] = None) -> State:
+    timings = state.setdefault('timings', {})
+    retrieved_docs=retrieve(query=retrieval_query or query, session_id=session_id, file_id=file_id, k=CONTEXT_CANDIDATES,
+                            query_vector=query_vector, timings=timings)
+    with timed("context_assembly", timings):
+        context = assemble_context(retrieved_docs)
+    state['context_tokens_saved'] = context.tokens_saved
+    state['context_tokens'] = context.context_tokens
+    state['context_documents'] = len({source['file_id'] for source in context.sources})
     system_message = SystemMessage(
         content="You are a helpful AI assistant. Answer the user's question using ONLY the information provided below. "
                 "If the answer is not in the context, say 'I don't know.' Do not make up information. "
-                f"Context: {docs_content}"
+                f"Context: {context.text}"
     )
 
     state['messages'].append(system_message)
     state['messages'].append(HumanMessage(content=query))
+    return state
+
 
-    response = llm.invoke(state["messages"])
+async def generate_response(query: str, state: State, session_id: str = None, file_id: int = None,
+                            retrieval_query: str = None, query_vector: List[float] = None,
+                            model: Optional[ModelName] = None) -> State:
+    # Retrieval and context assembly are blocking (SQLite, vector store), so they run off the event loop
+    state = await run_retrieval_work(add_context_messages, query, state, session_id=session_id, file_id=file_id,
+                                    retrieval_query=retrieval_query, query_vector=query_vector)
+    decision = route_answer("chat", model, query, state['context_tokens'], state['context_documents'])
+    state['routed_model'] = decision.model
+    with timed("generate", state['timings']), routed(decision) as model_name:
+        response = await model_pool.ainvoke(model_name, state["messages"])
     state['messages'].append(AIMessage(content=response.content))
     return state
 
 
-
+async def stream_response(query: str, state: State, session_id: str = None, file_id: int = None,
+                          retrieval_query: str = None, query_vector: List[float] = None,
+                          model: Optional[ModelName] = None) -> AsyncIterator[str]:
+    state = await run_retrieval_work(add_context_messages, query, state, session_id=session_id, file_id=file_id,
+                                    retrieval_query=retrieval_query, query_vector=query_vector)
+    decision = route_answer("chat", model, query, state['context_tokens'], state['context_documents'])
+    state['routed_model'] = decision.model
+    with timed("generate", state['timings']), routed(decision) as model_name:
+        async for chunk in model_pool.astream(model_name, state["messages"]):
+            if chunk.content:
+                yield chunk.content
@@ -0,0 +1,194 @@
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+from dotenv import load_dotenv
+from langchain_core.messages import BaseMessage, BaseMessageChunk
+from langchain_openai import ChatOpenAI
+
+from backend.metrics import llm_errors, llm_latency, llm_tokens
+
+load_dotenv()
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+
+# Model used for summaries and answer evaluation when a request names none.
+DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", "gpt-4.1")
+# In-flight requests allowed per model; further callers wait for a slot.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "64"))
+# Seconds a single LLM request may take, including waiting for a slot.
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+# Connections kept open to the API, shared by every model.
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "200"))
+# Threads for blocking work around LLM calls (summaries, challenge questions, chat
+# compaction), kept apart from the default executor that chat uses for I/O.
+LLM_WORKER_THREADS = int(os.getenv("LLM_WORKER_THREADS", "32"))
+
+
+class ModelPool:
+    """One ChatOpenAI client per model name, all sharing pooled HTTP connections.
+
+    Async calls go through a per-model semaphore and an overall timeout, so
+    a slow or saturated model makes its own callers wait without starving
+    the others. ``invoke`` and ``batch`` are the blocking forms for worker
+    threads: once ``bind_loop`` has been given the server's event loop they
+    run ``ainvoke`` there, under the same limits.
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, timeout: float = LLM_TIMEOUT):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._models: Dict[str, ChatOpenAI] = {}
+        self._limits: Dict[str, asyncio.Semaphore] = {}
+        self._http_client = None
+        self._http_async_client = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def _limits_config(self) -> httpx.Limits:
+        return httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS)
+
+    def get(self, model_name: str = DEFAULT_MODEL) -> ChatOpenAI:
+        with self._lock:
+            model = self._models.get(model_name)
+            if model is None:
+                if self._http_client is None:
+                    self._http_client = httpx.Client(limits=self._limits_config(), timeout=self.timeout)
+                    self._http_async_client = httpx.AsyncClient(limits=self._limits_config(), timeout=self.timeout)
+                model = ChatOpenAI(model=model_name, api_key=OPENAI_API_KEY, timeout=self.timeout,
+                                   http_client=self._http_client, http_async_client=self._http_async_client)
+                self._models[model_name] = model
+                self._limits[model_name] = asyncio.Semaphore(self.max_concurrency)
+            return model
+
+    def limit(self, model_name: str) -> asyncio.Semaphore:
+        self.get(model_name)
+        return self._limits[model_name]
+
+    async def _limited_invoke(self, model_name: str, messages: List[BaseMessage]) -> BaseMessage:
+        async with self.limit(model_name):
+            return await self.get(model_name).ainvoke(messages)
+
+    def _record_usage(self, model_name: str, message: BaseMessage):
+        usage = getattr(message, "usage_metadata", None)
+        if usage:
+            llm_tokens.inc(usage.get("input_tokens", 0), model=model_name, kind="input")
+            llm_tokens.inc(usage.get("output_tokens", 0), model=model_name, kind="output")
+
+    @contextmanager
+    def _observed(self, model_name: str):
+        """Record the call's latency, and an error if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            llm_errors.inc(model=model_name)
+            raise
+        finally:
+            llm_latency.observe(time.perf_counter() - start, model=model_name)
+
+    async def ainvoke(self, model_name: str, messages: List[BaseMessage]) -> BaseMessage:
+        with self._observed(model_name):
+            response = await asyncio.wait_for(self._limited_invoke(model_name, messages), self.timeout)
+        self._record_usage(model_name, response)
+        return response
+
+    async def astream(self, model_name: str, messages: List[BaseMessage]) -> AsyncIterator[BaseMessageChunk]:
+        model = self.get(model_name)
+        slot = self.limit(model_name)
+        with self._observed(model_name):
+            # The timeout applies to waiting for a slot and to each chunk rather than the whole stream
+            await asyncio.wait_for(slot.acquire(), self.timeout)
+            try:
+                chunks = model.astream(messages).__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), self.timeout)
+                    except StopAsyncIteration:
+                        break
+                    self._record_usage(model_name, chunk)
+                    yield chunk
+            finally:
+                slot.release()
+
+    async def abatch(self, model_name: str, inputs: List[List[BaseMessage]], max_concurrency: int) -> List[BaseMessage]:
+        slots = asyncio.Semaphore(max_concurrency)
+
+        async def one(messages):
+            async with slots:
+                return await self.ainvoke(model_name, messages)
+
+        return list(await asyncio.gather(*(one(messages) for messages in inputs)))
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    def _server_loop(self) -> Optional[asyncio.AbstractEventLoop]:
+        loop = self._loop
+        if loop is None or not loop.is_running():
+            return None
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            raise RuntimeError("Blocking LLM call on the event loop; await ainvoke instead")
+        return loop
+
+    def _wait(self, coro, loop: asyncio.AbstractEventLoop):
+        future: Future = asyncio.run_coroutine_threadsafe(coro, loop)
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+        return future.result()
+
+    def _invoke_directly(self, model_name: str, messages: List[BaseMessage]) -> BaseMessage:
+        with self._observed(model_name):
+            response = self.get(model_name).invoke(messages)
+        self._record_usage(model_name, response)
+        return response
+
+    def invoke(self, model_name: str, messages: List[BaseMessage]) -> BaseMessage:
+        loop = self._server_loop()
+        if loop is None:
+            # Outside the server (scripts) nothing shares the limits; call the sync client
+            return self._invoke_directly(model_name, messages)
+        return self._wait(self.ainvoke(model_name, messages), loop)
+
+    def batch(self, model_name: str, inputs: List[List[BaseMessage]], max_concurrency: int) -> List[BaseMessage]:
+        loop = self._server_loop()
+        if loop is None:
+            with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+                return list(pool.map(functools.partial(self._invoke_directly, model_name), inputs))
+        return self._wait(self.abatch(model_name, inputs, max_concurrency), loop)
+
+    async def aclose(self):
+        # Worker threads still waiting on a call get CancelledError instead of hanging
+        with self._lock:
+            pending, self._pending = list(self._pending), set()
+            self._loop = None
+        for future in pending:
+            future.cancel()
+        if self._http_async_client is not None:
+            await self._http_async_client.aclose()
+        if self._http_client is not None:
+            self._http_client.close()
+        with self._lock:
+            self._models.clear()
+            self._limits.clear()
+            self._http_client = self._http_async_client = None
+
+
+model_pool = ModelPool()
+llm_executor = ThreadPoolExecutor(max_workers=LLM_WORKER_THREADS, thread_name_prefix="llm")
+
+
+async def run_llm_work(fn, *args, **kwargs):
+    """Await blocking code that calls the LLM, run on ``llm_executor``."""
+    return await asyncio.get_running_loop().run_in_executor(llm_executor, functools.partial(fn, *args, **kwargs))
@@ -0,0 +1,458 @@
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from typing import Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+
+# Rows are appended to a float32 matrix on disk that grows by doubling.
+INITIAL_CAPACITY = 1024
+# Coarse partitioning (IVF) kicks in once this many live vectors exist.
+IVF_THRESHOLD = 50000
+IVF_TRAIN_SAMPLE = 20000
+IVF_ITERATIONS = 10
+# Candidates are scored through the contiguous slice spanning them while it is at most
+# this many times their count; copying scattered rows out costs several times more per row.
+SLICE_SCAN_RATIO = 4
+# Deleted and replaced rows are reclaimed once they make up this share of the matrix.
+COMPACT_DEAD_RATIO = 0.25
+COMPACT_MIN_DEAD_ROWS = 1024
+
+
+def _train_centroids(matrix: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """Spherical k-means with sqrt(len(rows)) centroids over a sample of ``rows``."""
+    nlist = max(1, int(np.sqrt(len(rows))))
+    rng = np.random.default_rng(0)
+    sample = rows if len(rows) <= IVF_TRAIN_SAMPLE else rng.choice(rows, IVF_TRAIN_SAMPLE, replace=False)
+    data = np.asarray(matrix[np.sort(sample)])
+    centroids = data[rng.choice(len(data), min(nlist, len(data)), replace=False)].copy()
+
+    for _ in range(IVF_ITERATIONS):
+        labels = np.argmax(data @ centroids.T, axis=1)
+        for c in range(len(centroids)):
+            members = data[labels == c]
+            if len(members):
+                centroid = members.mean(axis=0)
+                norm = np.linalg.norm(centroid)
+                centroids[c] = centroid / norm if norm else centroid
+    return centroids.astype(np.float32)
+
+
+def _nearest_centroids(matrix: np.ndarray, rows: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    labels = np.empty(len(rows), dtype=np.int64)
+    for start in range(0, len(rows), 65536):
+        batch = rows[start:start + 65536]
+        labels[start:start + len(batch)] = np.argmax(matrix[batch] @ centroids.T, axis=1)
+    return labels
+
+
+def _partition(rows: np.ndarray, labels: np.ndarray, nlist: int) -> List[np.ndarray]:
+    """Sorted rows of each centroid's list."""
+    order = np.argsort(labels, kind="stable")
+    bounds = np.searchsorted(labels[order], np.arange(nlist + 1))
+    return [rows[order[bounds[c]:bounds[c + 1]]] for c in range(nlist)]
+
+
+class LocalVectorStore(VectorStore):
+    """Vector store kept in a memory-mapped float32 matrix on local disk.
+
+    Vectors are normalised on insert, so cosine top-k is one matrix-vector
+    product. Chunk text and metadata live in a SQLite side table. Like
+    Pinecone, rows belong to a namespace ("" by default) and a search only
+    scores its own namespace. When a search still has ``ivf_threshold`` or
+    more candidates after the namespace and file filters, it only scans the
+    ``nprobe`` nearest k-means partitions. New rows join the partition of
+    their nearest centroid; the centroids are retrained, without holding
+    the store lock, each time the store doubles. Rows freed by deletes are
+    reclaimed by ``compact``.
+    """
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        path: str,
+        dimensions: int = 1024,
+        ivf_threshold: int = IVF_THRESHOLD,
+        nprobe: int = 8,
+    ):
+        self._embedding = embedding
+        self.path = path
+        self.dimensions = dimensions
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self._lock = threading.RLock()
+        # Bumped whenever compaction renumbers rows; a training run from before it is discarded
+        self._generation = 0
+        self._training = False
+
+        os.makedirs(path, exist_ok=True)
+        self._matrix_path = os.path.join(path, "vectors.f32")
+        self._centroids_path = os.path.join(path, "centroids.npy")
+        self._meta = sqlite3.connect(os.path.join(path, "metadata.db"), check_same_thread=False)
+        self._meta.execute('''CREATE TABLE IF NOT EXISTS chunks
+                              (row INTEGER PRIMARY KEY,
+                               id TEXT UNIQUE,
+                               file_id INTEGER,
+                               text TEXT,
+                               metadata TEXT,
+                               deleted INTEGER DEFAULT 0,
+                               namespace TEXT DEFAULT '')''')
+        columns = [row[1] for row in self._meta.execute('PRAGMA table_info(chunks)')]
+        if 'namespace' not in columns:
+            self._meta.execute("ALTER TABLE chunks ADD COLUMN namespace TEXT DEFAULT ''")
+        self._meta.execute('CREATE INDEX IF NOT EXISTS idx_chunks_file_id ON chunks (file_id)')
+        self._meta.commit()
+        self._load()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    # Storage
+    def _load(self):
+        row = self._meta.execute('SELECT MAX(row) FROM chunks').fetchone()
+        self._count = 0 if row[0] is None else row[0] + 1
+
+        if os.path.exists(self._matrix_path):
+            capacity = os.path.getsize(self._matrix_path) // (4 * self.dimensions)
+        else:
+            capacity = 0
+        self._matrix = None
+        self._open_matrix(max(capacity, self._count, INITIAL_CAPACITY))
+
+        self._alive = np.zeros(self._capacity, dtype=bool)
+        self._file_ids = np.full(self._capacity, -1, dtype=np.int64)
+        self._namespace_codes = np.full(self._capacity, -1, dtype=np.int32)
+        self._namespace_ids = {}
+        self._namespace_rows = {}
+        for r, file_id, namespace in self._meta.execute('SELECT row, file_id, namespace FROM chunks WHERE deleted = 0'):
+            self._alive[r] = True
+            self._file_ids[r] = -1 if file_id is None else file_id
+            self._namespace_codes[r] = self._namespace_code(namespace or "")
+
+        self._centroids = None
+        self._lists = None
+        self._trained_at = 0
+        if os.path.exists(self._centroids_path):
+            self._centroids = np.load(self._centroids_path)
+            rows = np.flatnonzero(self._alive[:self._count])
+            self._lists = _partition(rows, _nearest_centroids(self._matrix, rows, self._centroids), len(self._centroids))
+            self._trained_at = len(rows)
+
+    def _open_matrix(self, capacity: int):
+        if self._matrix is not None:
+            self._matrix.flush()
+            del self._matrix
+        with open(self._matrix_path, "ab") as f:
+            f.truncate(capacity * self.dimensions * 4)
+        self._matrix = np.memmap(self._matrix_path, dtype=np.float32, mode="r+", shape=(capacity, self.dimensions))
+        self._capacity = capacity
+
+    def _ensure_capacity(self, needed: int):
+        if needed <= self._capacity:
+            return
+        capacity = self._capacity
+        while capacity < needed:
+            capacity *= 2
+        self._open_matrix(capacity)
+        self._alive = np.concatenate([self._alive, np.zeros(capacity - len(self._alive), dtype=bool)])
+        self._file_ids = np.concatenate([self._file_ids, np.full(capacity - len(self._file_ids), -1, dtype=np.int64)])
+        self._namespace_codes = np.concatenate([self._namespace_codes, np.full(capacity - len(self._namespace_codes), -1, dtype=np.int32)])
+
+    def _namespace_code(self, namespace: str) -> int:
+        if namespace not in self._namespace_ids:
+            self._namespace_ids[namespace] = len(self._namespace_ids)
+        return self._namespace_ids[namespace]
+
+    def _rows_in_namespace(self, namespace: str) -> np.ndarray:
+        code = self._namespace_ids.get(namespace)
+        if code is None:
+            return np.empty(0, dtype=np.int64)
+        if code not in self._namespace_rows:
+            live = self._alive[:self._count] & (self._namespace_codes[:self._count] == code)
+            self._namespace_rows[code] = np.flatnonzero(live)
+        return self._namespace_rows[code]
+
+    # IVF coarse partitioning
+    def _needs_training(self) -> bool:
+        live = int(self._alive[:self._count].sum())
+        if live < self.ivf_threshold or self._training:
+            return False
+        # Retrain whenever the corpus has doubled since the last training run.
+        return self._centroids is None or live >= 2 * self._trained_at
+
+    def _add_to_lists(self, rows: np.ndarray):
+        # New rows have the highest row numbers, so appending keeps every list sorted
+        labels = _nearest_centroids(self._matrix, rows, self._centroids)
+        for c in np.unique(labels):
+            self._lists[c] = np.concatenate([self._lists[c], rows[labels == c]])
+
+    def _retrain(self):
+        """Train centroids and partition the rows outside the lock, then swap the result in."""
+        with self._lock:
+            if not self._needs_training():
+                return
+            self._training = True
+            generation, matrix, count = self._generation, self._matrix, self._count
+            rows = np.flatnonzero(self._alive[:count])
+        try:
+            # Searches and writes go on meanwhile: rows below ``count`` are never rewritten in
+            # place, and this keeps its own reference to the matrix if compaction replaces it
+            centroids = _train_centroids(matrix, rows)
+            lists = _partition(rows, _nearest_centroids(matrix, rows, centroids), len(centroids))
+            with self._lock:
+                if self._generation != generation:
+                    return
+                self._centroids, self._lists, self._trained_at = centroids, lists, len(rows)
+                # Rows added while training ran; rows deleted meanwhile are skipped at search time
+                added = count + np.flatnonzero(self._alive[count:self._count])
+                if len(added):
+                    self._add_to_lists(added)
+                np.save(self._centroids_path, centroids)
+        finally:
+            with self._lock:
+                self._training = False
+
+    # VectorStore API
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        vectors = self._embedding.embed_documents(texts)
+        return self.add_embeddings(texts, vectors, metadatas=metadatas, ids=ids, namespace=kwargs.get("namespace") or "")
+
+    def add_embeddings(
+        self,
+        texts: List[str],
+        embeddings: List[List[float]],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        namespace: str = "",
+    ) -> List[str]:
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+
+        with self._lock:
+            # Re-adding an existing id replaces the old row.
+            self._delete_ids(ids)
+            start = self._count
+            self._ensure_capacity(start + len(texts))
+            rows = np.arange(start, start + len(texts))
+            self._matrix[rows] = vectors
+            self._matrix.flush()
+
+            file_ids = [m.get("file_id") for m in metadatas]
+            self._meta.executemany(
+                'INSERT INTO chunks (row, id, file_id, text, metadata, namespace) VALUES (?, ?, ?, ?, ?, ?)',
+                [(int(r), i, f, t, json.dumps(m), namespace) for r, i, f, t, m in zip(rows, ids, file_ids, texts, metadatas)]
+            )
+            self._meta.commit()
+
+            self._count = start + len(texts)
+            self._alive[rows] = True
+            self._file_ids[rows] = [-1 if f is None else int(f) for f in file_ids]
+            self._namespace_codes[rows] = self._namespace_code(namespace)
+            self._namespace_rows.clear()
+
+            if self._lists is not None:
+                self._add_to_lists(rows)
+        self._retrain()
+        return ids
+
+    def _delete_rows(self, rows: List[int]):
+        if not rows:
+            return
+        self._meta.executemany('UPDATE chunks SET deleted = 1, id = NULL WHERE row = ?', [(r,) for r in rows])
+        self._meta.commit()
+        # Dead rows stay in the IVF lists until compaction; searches skip them
+        self._alive[rows] = False
+        self._namespace_rows.clear()
+        self._maybe_compact()
+
+    def _maybe_compact(self):
+        dead = self._count - int(self._alive[:self._count].sum())
+        if dead >= COMPACT_MIN_DEAD_ROWS and dead >= self._count * COMPACT_DEAD_RATIO:
+            self.compact()
+
+    def compact(self):
+        """Rewrite the matrix without deleted rows and renumber the live ones to match."""
+        with self._lock:
+            live = np.flatnonzero(self._alive[:self._count])
+            compacted_path = self._matrix_path + ".compact"
+            with open(compacted_path, "wb") as f:
+                for start in range(0, len(live), 65536):
+                    f.write(np.ascontiguousarray(self._matrix[live[start:start + 65536]]).tobytes())
+            self._meta.execute('DELETE FROM chunks WHERE deleted = 1')
+            # Rows only move down and in ascending order, so no update collides with a live row
+            self._meta.executemany('UPDATE chunks SET row = ? WHERE row = ?',
+                                   [(new, int(old)) for new, old in enumerate(live) if new != old])
+            self._matrix.flush()
+            self._matrix = None
+            os.replace(compacted_path, self._matrix_path)
+            self._meta.commit()
+            self._generation += 1
+            self._load()
+
+    def _delete_ids(self, ids: List[str]) -> int:
+        rows = []
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows.extend(r for (r,) in self._meta.execute(
+                f'SELECT row FROM chunks WHERE deleted = 0 AND id IN ({placeholders})', batch))
+        self._delete_rows(rows)
+        return len(rows)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if ids is None:
+            return False
+        with self._lock:
+            self._delete_ids(list(ids))
+        return True
+
+    def delete_by_file_id(self, file_id: int) -> int:
+        with self._lock:
+            rows = [r for (r,) in self._meta.execute(
+                'SELECT row FROM chunks WHERE deleted = 0 AND file_id = ?', (file_id,))]
+            self._delete_rows(rows)
+        return len(rows)
+
+    def set_namespace(self, file_id: int, namespace: str) -> int:
+        """Move every chunk of ``file_id`` into ``namespace``."""
+        with self._lock:
+            rows = [r for (r,) in self._meta.execute(
+                'SELECT row FROM chunks WHERE deleted = 0 AND file_id = ?', (file_id,))]
+            self._meta.execute('UPDATE chunks SET namespace = ? WHERE deleted = 0 AND file_id = ?', (namespace, file_id))
+            self._meta.commit()
+            self._namespace_codes[rows] = self._namespace_code(namespace)
+            self._namespace_rows.clear()
+        return len(rows)
+
+    def get_by_ids(self, ids, /) -> List[Document]:
+        ids = list(ids)
+        if not ids:
+            return []
+        placeholders = ",".join("?" * len(ids))
+        with self._lock:
+            rows = self._meta.execute(
+                f'SELECT id, text, metadata FROM chunks WHERE deleted = 0 AND id IN ({placeholders})', ids).fetchall()
+        return [Document(id=i, page_content=t, metadata=json.loads(m)) for i, t, m in rows]
+
+    def _filter_rows(self, rows: np.ndarray, filter: Optional[dict]) -> np.ndarray:
+        if filter:
+            for key, condition in filter.items():
+                if key != "file_id":
+                    raise ValueError(f"Unsupported filter field: {key}")
+                if isinstance(condition, dict):
+                    if "$eq" in condition:
+                        allowed = [condition["$eq"]]
+                    elif "$in" in condition:
+                        allowed = condition["$in"]
+                    else:
+                        raise ValueError(f"Unsupported filter operator: {condition}")
+                else:
+                    allowed = [condition]
+                rows = rows[np.isin(self._file_ids[rows], np.asarray(allowed, dtype=np.int64))]
+        return rows
+
+    def _candidate_rows(self, query: np.ndarray, filter: Optional[dict], namespace: str) -> np.ndarray:
+        """Sorted rows to score: the filtered namespace, narrowed to the nearest IVF lists when it is big."""
+        rows = self._filter_rows(self._rows_in_namespace(namespace), filter)
+        if self._lists is not None and len(rows) >= self.ivf_threshold:
+            probes = np.argsort(-(self._centroids @ query))[:self.nprobe]
+            probed = np.sort(np.concatenate([self._lists[c] for c in probes]))
+            probed = probed[self._alive[probed] & (self._namespace_codes[probed] == self._namespace_ids[namespace])]
+            rows = self._filter_rows(probed, filter)
+        return rows
+
+    def _score(self, rows: np.ndarray, query: np.ndarray) -> np.ndarray:
+        lo, hi = int(rows[0]), int(rows[-1]) + 1
+        if hi - lo <= SLICE_SCAN_RATIO * len(rows):
+            return (self._matrix[lo:hi] @ query)[rows - lo]
+        return self._matrix[rows] @ query
+
+    def similarity_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[dict] = None,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        with self._lock:
+            rows = self._candidate_rows(query, filter, kwargs.get("namespace") or "")
+            if len(rows) == 0:
+                return []
+            scores = self._score(rows, query)
+            if len(rows) > k:
+                top = np.argpartition(-scores, k)[:k]
+            else:
+                top = np.arange(len(rows))
+            top = top[np.argsort(-scores[top])]
+            hits = [(int(rows[i]), float(scores[i])) for i in top]
+
+            placeholders = ",".join("?" * len(hits))
+            by_row = {r: (i, t, m) for r, i, t, m in self._meta.execute(
+                f'SELECT row, id, text, metadata FROM chunks WHERE row IN ({placeholders})',
+                [r for r, _ in hits])}
+
+        results = []
+        for r, score in hits:
+            chunk_id, text, metadata = by_row[r]
+            results.append((Document(id=chunk_id, page_content=text, metadata=json.loads(metadata)), score))
+        return results
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        embedding = self._embedding.embed_query(query)
+        return self.similarity_search_with_score_by_vector(embedding, k=k, filter=filter, **kwargs)
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k=k, filter=filter, **kwargs)]
+
+    def similarity_search(
+        self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        # Scores are already cosine similarities in [-1, 1].
+        return lambda score: min(1.0, max(0.0, (score + 1) / 2))
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        path: str = "vector_store",
+        **kwargs: Any,
+    ) -> "LocalVectorStore":
+        store = cls(embedding=embedding, path=path, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
@@ -1,67 +1,234 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form
-from backend.pydantic_models import QueryInput, QueryResponse, DocumentInfo, DeleteFileRequest, ChallengeRequest, EvaluateAnswer
-from backend.langchain_utils import generate_response, retrieve
-from backend.db_utils import insert_application_logs, get_chat_history, get_all_documents, insert_document_record, delete_document_record, get_file_content
-from backend.pinecone_utilis import index_document_to_pinecone, delete_doc_from_pinecone, load_and_split_document
-from langchain_openai import ChatOpenAI
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, BackgroundTasks
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from backend.pydantic_models import ModelName, QueryInput, QueryResponse, DocumentInfo, DeleteFileRequest, ChallengeRequest, EvaluateAnswer, JobStatus, SummaryRequest
+from backend.hybrid_search import embed_search_query, run_retrieval_work
+from backend.langchain_utils import generate_response, stream_response, retrieve, condense_question
+from backend.summarization import summarize_document, generate_challenge_questions
+from backend.db_utils import insert_application_logs, get_all_documents, insert_document_records, delete_document_record, release_document_record, link_document_record, get_file_content, get_ingestion_job, get_document_index_info, get_scope_file_ids, ping_db
+from backend.pinecone_utilis import delete_doc_from_pinecone, embeddings, ping_vectorstore
+from backend.answer_cache import answer_cache
+from backend.ingestion import ingest_file
+from backend.indexing_engine import IndexingError
+from backend.jobs import BATCH_UPLOAD_CONCURRENCY, new_job_id, spool_upload, submit_ingestion_job, submit_linked_job, resume_ingestion_jobs, retry_ingestion_job, keep_failed_upload, UploadTooLargeError
+from backend.chat_memory import load_chat_memory, compact_chat_memory
+from backend.token_utils import count_message_tokens
+from backend.pdf_loader import shutdown_parser_pool
+from backend.context_assembly import CONTEXT_CANDIDATES, assemble_context
+from contextlib import asynccontextmanager
+from backend.llm_clients import DEFAULT_MODEL, model_pool, run_llm_work
+from backend.model_router import route_answer, routed
+from backend import metrics
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.messages import SystemMessage, AIMessage, HumanMessage
+from typing import List
 import os
+import asyncio
+import json
 import uuid
 import logging
-import shutil
+import time
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 
 # Set up logging
 logging.basicConfig(filename='app.log', level=logging.INFO)
 
+ALLOWED_EXTENSIONS = ['.pdf', '.txt']
+
+# Dependencies /readyz reports on; each check raises if its dependency is unusable.
+READINESS_CHECKS = {
+    "database": ping_db,
+    "vector_store": ping_vectorstore,
+    "embedding_cache": embeddings.ping,
+    "embedding_model": lambda: embeddings.underlying,
+    "llm": lambda: model_pool.get(DEFAULT_MODEL),
+}
+
+def check_readiness():
+    checks = {}
+    for name, check in READINESS_CHECKS.items():
+        try:
+            check()
+            checks[name] = "ok"
+        except Exception as e:
+            checks[name] = f"error: {e}"
+    return checks
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Connections and clients are opened here rather than at import. A dependency
+    # that is down is reported by /readyz instead of keeping the app from starting.
+    # Worker threads send their LLM calls to this loop, under the same limits as chat
+    model_pool.bind_loop(asyncio.get_running_loop())
+    checks = await asyncio.to_thread(check_readiness)
+    for name, status in checks.items():
+        if status != "ok":
+            logging.warning(f"Startup check {name} failed: {status}")
+    if checks["database"] == "ok":
+        # Pick up background ingestion jobs interrupted by the last shutdown
+        resume_ingestion_jobs()
+    yield
+    shutdown_parser_pool()
+    await model_pool.aclose()
+
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+
+metrics.register_cache("answers", answer_cache.stats)
+metrics.register_cache("embeddings", embeddings.stats)
+
+async def lookup_answer(question, chat_history, session_id, file_id, model, timings):
+    """Standalone form of the question, its embedding, the document-set key and any cached answer."""
+    with metrics.timed("condense_question", timings):
+        standalone_question = await condense_question(question, chat_history, model)
+    scope = answer_cache.scope_key(await asyncio.to_thread(get_scope_file_ids, session_id, file_id))
+    # No vector in lexical mode or when embedding fails: the cache is skipped and retrieval uses keywords
+    query_vector = await run_retrieval_work(embed_search_query, standalone_question, timings)
+    # An explicit model only reuses its own answers; "auto" takes whichever model answered
+    cache_model = None if model == ModelName.AUTO else model.value
+    cached = answer_cache.lookup(scope, query_vector, cache_model) if scope and query_vector is not None else None
+    return standalone_question, scope, query_vector, cached
+
+def observe_tokens(history_tokens, prompt_tokens, context_tokens_saved):
+    metrics.request_tokens.observe(history_tokens, kind="history")
+    metrics.request_tokens.observe(prompt_tokens, kind="prompt")
+    metrics.request_tokens.observe(context_tokens_saved, kind="context_saved")
 
 @app.post("/chat", response_model=QueryResponse)
-def chat(query_input: QueryInput):
+async def chat(query_input: QueryInput, background_tasks: BackgroundTasks):
     session_id = query_input.session_id or str(uuid.uuid4())
     logging.info(f"Session ID: {session_id}, User Query: {query_input.question}, Model: {query_input.model.value}")
-    chat_history = get_chat_history(session_id)
-    print(chat_history)
-    state={"messages":chat_history} # test
-    messages_state = generate_response(query=query_input.question, state=state)
-    answer=messages_state["messages"][-1].content
+    timings = {}
+    with metrics.timed("chat_history", timings):
+        chat_history, history_tokens = await asyncio.to_thread(load_chat_memory, session_id)
+    try:
+        standalone_question, scope, query_vector, cached = await lookup_answer(query_input.question, chat_history, session_id,
+                                                                               query_input.file_id, query_input.model, timings)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="The model took too long to respond")
+    if cached is not None:
+        answer = cached.answer
+        prompt_tokens = 0
+        context_tokens_saved = 0
+        routed_model = cached.model
+        logging.info(f"Session ID: {session_id}, answer cache hit for: {cached.question}")
+    else:
+        state={"messages":chat_history, "timings":timings}
+        try:
+            messages_state = await generate_response(query=query_input.question, state=state, session_id=session_id,
+                                                     file_id=query_input.file_id, retrieval_query=standalone_question,
+                                                     query_vector=query_vector, model=query_input.model)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="The model took too long to respond")
+        answer=messages_state["messages"][-1].content
+        prompt_tokens = count_message_tokens(messages_state["messages"][:-1])
+        context_tokens_saved = messages_state.get("context_tokens_saved", 0)
+        routed_model = messages_state.get("routed_model") or query_input.model.value
+        if scope and query_vector is not None:
+            answer_cache.store(scope, standalone_question, query_vector, answer, routed_model)
+
+    with metrics.timed("insert_logs", timings):
+        await asyncio.to_thread(insert_application_logs, session_id, query_input.question, answer,
+                                routed_model, dict(timings))
+    observe_tokens(history_tokens, prompt_tokens, context_tokens_saved)
+    background_tasks.add_task(run_llm_work, compact_chat_memory, session_id)
+    logging.info(f"Session ID: {session_id}, AI Response: {answer}, History tokens: {history_tokens}, Prompt tokens: {prompt_tokens}, Context tokens saved: {context_tokens_saved}, Timings: {timings}")
+    return QueryResponse(answer=answer, session_id=session_id, model=query_input.model, prompt_tokens=prompt_tokens,
+                         timings=timings, context_tokens_saved=context_tokens_saved, routed_model=routed_model)
+
+@app.post("/chat/stream")
+async def chat_stream(query_input: QueryInput):
+    session_id = query_input.session_id or str(uuid.uuid4())
+    logging.info(f"Session ID: {session_id}, User Query (stream): {query_input.question}, Model: {query_input.model.value}")
+    timings = {}
+    with metrics.timed("chat_history", timings):
+        chat_history, history_tokens = await asyncio.to_thread(load_chat_memory, session_id)
+    state={"messages":chat_history, "timings":timings}
 
-    insert_application_logs(session_id, query_input.question, answer, query_input.model.value)
-    logging.info(f"Session ID: {session_id}, AI Response: {answer}")
-    return QueryResponse(answer=answer, session_id=session_id, model=query_input.model)
+    async def event_stream():
+        yield f"event: session\ndata: {json.dumps({'session_id': session_id})}\n\n"
+        tokens = []
+        try:
+            standalone_question, scope, query_vector, cached = await lookup_answer(query_input.question, chat_history, session_id,
+                                                                                   query_input.file_id, query_input.model, timings)
+            if cached is not None:
+                logging.info(f"Session ID: {session_id}, answer cache hit for: {cached.question}")
+                tokens.append(cached.answer)
+                yield f"data: {json.dumps({'token': cached.answer})}\n\n"
+            else:
+                async for token in stream_response(query=query_input.question, state=state, session_id=session_id,
+                                                   file_id=query_input.file_id, retrieval_query=standalone_question,
+                                                   query_vector=query_vector, model=query_input.model):
+                    tokens.append(token)
+                    yield f"data: {json.dumps({'token': token})}\n\n"
+        except Exception as e:
+            logging.error(f"Session ID: {session_id}, streaming failed: {e}")
+            yield f"event: error\ndata: {json.dumps({'detail': 'Failed to generate response'})}\n\n"
+            return
+
+        # Only the finished answer is written to the chat history
+        answer = "".join(tokens)
+        context_tokens_saved = state.get("context_tokens_saved", 0)
+        if cached is not None:
+            prompt_tokens = 0
+            routed_model = cached.model
+        else:
+            prompt_tokens = count_message_tokens(state["messages"])
+            routed_model = state.get("routed_model") or query_input.model.value
+            if scope and query_vector is not None:
+                answer_cache.store(scope, standalone_question, query_vector, answer, routed_model)
+        with metrics.timed("insert_logs", timings):
+            await asyncio.to_thread(insert_application_logs, session_id, query_input.question, answer,
+                                    routed_model, dict(timings))
+        observe_tokens(history_tokens, prompt_tokens, context_tokens_saved)
+        logging.info(f"Session ID: {session_id}, AI Response: {answer}, History tokens: {history_tokens}, Prompt tokens: {prompt_tokens}, Context tokens saved: {context_tokens_saved}, Timings: {timings}")
+        done = {'answer': answer, 'session_id': session_id, 'model': query_input.model.value, 'prompt_tokens': prompt_tokens,
+                'timings': timings, 'context_tokens_saved': context_tokens_saved, 'routed_model': routed_model}
+        yield f"event: done\ndata: {json.dumps(done)}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+                             background=BackgroundTask(run_llm_work, compact_chat_memory, session_id))
 
 @app.post('/challenge-me', response_model=list[str])
-def challenge_me(request: ChallengeRequest):
+async def challenge_me(request: ChallengeRequest):
     file_id = request.file_id
     
-    content = get_file_content(file_id)
+    content = await asyncio.to_thread(get_file_content, file_id)
     if content is None:
         raise HTTPException(status_code=404, detail="Document not found")
 
-    
-    llm = ChatOpenAI(
-        model='gpt-4.1',
-        api_key=OPENAI_API_KEY
-    )
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", "You are a helpful AI assistant. Generate three logic-based or comprehension-focused questions about the following document. Each question should require understanding or reasoning about the document content, not just simple recall. Provide each question on a new line."),
-        ("human", "Document: {context}\n\nQuestions:")
-    ])
-    chain = prompt | llm | StrOutputParser()
-    questions_str = chain.invoke({"context": content})
-    questions = [q.strip() for q in questions_str.split('\n') if q.strip()][:3]
+
+    # Long documents are condensed section by section before picking questions
+    try:
+        questions = await run_llm_work(generate_challenge_questions, content, regenerate=request.regenerate,
+                                       model=request.model)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="The model took too long to respond")
 
     return questions
 
 
 
+@app.post('/summary')
+async def document_summary(request: SummaryRequest):
+    content = await asyncio.to_thread(get_file_content, request.file_id)
+    if content is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    # Served from the artifact cache unless a fresh summary is requested
+    try:
+        summary = await run_llm_work(summarize_document, content, regenerate=request.regenerate,
+                                     model=request.model)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="The model took too long to respond")
+    return {"file_id": request.file_id, "summary": summary}
+
+
+
 @app.post('/evaluate-response')
-def evaluate_response(request: EvaluateAnswer):
+async def evaluate_response(request: EvaluateAnswer):
     # get the file ralated to answers
     file_id = request.file_id
     question = request.question
@@ -69,13 +236,11 @@ def evaluate_response(request: EvaluateAnswer):
 
     # evaluate the useranswer according to the research paper
 
-    llm = ChatOpenAI(
-        model='gpt-4.1',
-        api_key=OPENAI_API_KEY
-    )
     # get the context from doc
-    retrieved_docs=retrieve(query=question)
-    docs_content = "\n\n".join(doc.page_content for doc in retrieved_docs)
+    if await asyncio.to_thread(get_document_index_info, file_id) is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    retrieved_docs = await run_retrieval_work(retrieve, query=question, file_id=file_id, k=CONTEXT_CANDIDATES)
+    context = await asyncio.to_thread(assemble_context, retrieved_docs)
 
 
     prompt = ChatPromptTemplate.from_messages([
@@ -84,77 +249,294 @@ def evaluate_response(request: EvaluateAnswer):
         ("human", "Question: {question}\nUser Answer: {user_answer}\nEvaluation:")
     ])
 
-    chain = prompt | llm | StrOutputParser()
-    evaluation = chain.invoke({
-        "context": docs_content,
-        "question": question,
-        "user_answer": user_answer
-    })
+    messages = prompt.format_messages(context=context.text, question=question, user_answer=user_answer)
+    decision = route_answer("evaluate", request.model, question, context.context_tokens,
+                            len({source['file_id'] for source in context.sources}))
+    try:
+        with routed(decision) as model_name:
+            response = await model_pool.ainvoke(model_name, messages)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="The model took too long to respond")
+    evaluation = StrOutputParser().invoke(response)
 
     return {
         "feedback": evaluation,
-        "file_id": file_id
+        "file_id": file_id,
+        "context_tokens_saved": context.tokens_saved
     }
 
 
 
 @app.post("/upload-doc")
-def upload_and_index_document(file: UploadFile = File(...), session_id: str = Form(None)):
+def upload_and_index_document(file: UploadFile = File(...), session_id: str = Form(None), async_ingest: bool = Form(False)):
     if not session_id:
         session_id = str(uuid.uuid4())
-    allowed_extensions = ['.pdf', '.txt']
     file_extension = os.path.splitext(file.filename)[1].lower()
 
-    if file_extension not in allowed_extensions:
-        raise HTTPException(status_code=400, detail=f"Unsupported file type. Allowed types are: {', '.join(allowed_extensions)}")
-
-    temp_file_path = f"temp_{file.filename}"
+    if file_extension not in ALLOWED_EXTENSIONS:
+        raise HTTPException(status_code=400, detail=f"Unsupported file type. Allowed types are: {', '.join(ALLOWED_EXTENSIONS)}")
 
+    job_id = new_job_id()
     try:
-        # Save the uploaded file to a temporary file
-        with open(temp_file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        docs = load_and_split_document(temp_file_path)
-        docs_content = "\n\n".join(doc.page_content for doc in docs)
-        file_id = insert_document_record(session_id, file.filename, docs_content)
-        success = index_document_to_pinecone(temp_file_path, file_id)
-
-        if success:
-            # generate summary
-
-            llm = ChatOpenAI(
-                model='gpt-4.1',
-                api_key=OPENAI_API_KEY
-            )
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", "You are a helpful assistant. Summarize the following document in no more than 150 words. Focus on the main points and key findings. Do not include information not present in the document."),
-                ("human", "{document}")
-            ])
-            chain = prompt | llm | StrOutputParser()
-            summary = chain.invoke({"document": docs_content})
+        file_path, content_hash = spool_upload(file.file, job_id, file.filename)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    # Content someone already indexed is linked instead of parsed and embedded again
+    linked_id = link_document_record(session_id, file.filename, content_hash)
+    if linked_id is not None:
+        os.remove(file_path)
+        answer_cache.invalidate_files(get_scope_file_ids(session_id))
+        logging.info(f"Linked upload {file.filename} to existing content as file_id {linked_id}")
+        if async_ingest:
+            submit_linked_job(job_id, file.filename, session_id, linked_id)
             return {
-                "message": f"File {file.filename} has been successfully uploaded and indexed.",
-                "file_id": file_id,
-                "summary": summary
+                "message": f"File {file.filename} was already indexed and has been added to the session.",
+                "job_id": job_id,
+                "session_id": session_id
             }
-        else:
-            delete_document_record(file_id)
+        # The link already succeeded; a failed summary only leaves it out of the response
+        try:
+            summary = summarize_document(get_file_content(linked_id))
+        except Exception as e:
+            logging.error(f"Error summarizing linked file_id {linked_id}: {e}")
+            summary = None
+        return {
+            "message": f"File {file.filename} was already indexed and has been added to the session.",
+            "file_id": linked_id,
+            "summary": summary,
+            "timings": {}
+        }
+
+    if async_ingest:
+        # Hand the file to the background workers and return straight away
+        submit_ingestion_job(job_id, file_path, file.filename, session_id, content_hash=content_hash)
+        return {
+            "message": f"File {file.filename} has been queued for indexing.",
+            "job_id": job_id,
+            "session_id": session_id
+        }
+
+    spool_kept = False
+    try:
+        # Parse, split and index in a single pass; the splits feed the DB record and the summary
+        try:
+            result = ingest_file(file_path, file.filename, session_id, keep_partial=True, content_hash=content_hash)
+        except IndexingError as e:
+            # Some chunks made it; keep them and the file so the upload can resume as a job
+            logging.error(f"Error indexing document {file.filename}: {e}")
+            keep_failed_upload(job_id, file_path, file.filename, session_id, content_hash, e)
+            spool_kept = True
+            return JSONResponse(status_code=500, content={
+                "detail": f"Failed to index {file.filename}. Resume it with POST /jobs/{job_id}/retry.",
+                "job_id": job_id,
+                "session_id": session_id
+            })
+        except Exception as e:
+            logging.error(f"Error indexing document {file.filename}: {e}")
             raise HTTPException(status_code=500, detail=f"Failed to index {file.filename}.")
+        logging.info(f"Indexed file_id {result.file_id}: {result.pages} pages, {len(result.splits)} chunks, timings {result.timings}")
+
+        # generate summary
+        summary_start = time.perf_counter()
+        summary = summarize_document(result.content)
+        result.timings["summary"] = round(time.perf_counter() - summary_start, 4)
+        metrics.observe_stage("upload_summary", result.timings["summary"])
+        return {
+            "message": f"File {file.filename} has been successfully uploaded and indexed.",
+            "file_id": result.file_id,
+            "summary": summary,
+            "timings": result.timings
+        }
     finally:
-        
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
+        if not spool_kept and os.path.exists(file_path):
+            os.remove(file_path)
+
+async def _spool_batch_file(file: UploadFile):
+    """Spool one file of a batch; returns (upload, result), where a result means it needs no indexing."""
+    if os.path.splitext(file.filename)[1].lower() not in ALLOWED_EXTENSIONS:
+        return None, {"filename": file.filename, "status": "failed",
+                      "error": f"Unsupported file type. Allowed types are: {', '.join(ALLOWED_EXTENSIONS)}"}
+    job_id = new_job_id()
+    try:
+        file_path, content_hash = await asyncio.to_thread(spool_upload, file.file, job_id, file.filename)
+    except UploadTooLargeError as e:
+        return None, {"filename": file.filename, "status": "failed", "error": str(e)}
+    upload = {"filename": file.filename, "job_id": job_id, "file_path": file_path, "content_hash": content_hash}
+    return upload, None
+
+async def _summarize_batch_file(result: dict, content: str, timings: dict):
+    summary_start = time.perf_counter()
+    try:
+        result["summary"] = await run_llm_work(summarize_document, content)
+        timings["summary"] = round(time.perf_counter() - summary_start, 4)
+        metrics.observe_stage("upload_summary", timings["summary"])
+    except Exception as e:
+        logging.error(f"Error summarizing {result['filename']}: {e}")
+        result["error"] = "Summary failed."
+    result["timings"] = timings
+    return result
+
+def _fill_duplicates(files: List[UploadFile], results: list, duplicates: list):
+    # Repeats within a batch point at the record and job of the copy that was kept
+    for i, first in duplicates:
+        results[i] = {"filename": files[i].filename, "status": "duplicate", "duplicate_of": files[first].filename,
+                      "file_id": results[first].get("file_id"), "job_id": results[first].get("job_id")}
+
+@app.post("/upload-docs")
+async def upload_and_index_documents(files: List[UploadFile] = File(...), session_id: str = Form(None),
+                                     async_ingest: bool = Form(False)):
+    """Index many files at once and report on each; one bad file does not fail the batch.
+
+    New files get their document records in a single transaction and are then
+    parsed, indexed and summarized concurrently, so the batch takes about as
+    long as its slowest file. With ``async_ingest`` each file is queued as its
+    own job and the response carries the job ids instead.
+    """
+    if not session_id:
+        session_id = str(uuid.uuid4())
+    batch_start = time.perf_counter()
+    results = [None] * len(files)
+    uploads = []
+    for i, (upload, result) in enumerate(await asyncio.gather(*(_spool_batch_file(f) for f in files))):
+        if upload is None:
+            results[i] = result
+        else:
+            uploads.append((i, upload))
+
+    # The same content twice in one batch is indexed once; content indexed before is linked
+    first_by_hash, new_uploads, linked, duplicates = {}, [], [], []
+    for i, upload in uploads:
+        first = first_by_hash.setdefault(upload["content_hash"], i)
+        if first != i:
+            os.remove(upload["file_path"])
+            duplicates.append((i, first))
+            continue
+        linked_id = await asyncio.to_thread(link_document_record, session_id, upload["filename"], upload["content_hash"])
+        if linked_id is None:
+            new_uploads.append((i, upload))
+            continue
+        os.remove(upload["file_path"])
+        logging.info(f"Linked upload {upload['filename']} to existing content as file_id {linked_id}")
+        results[i] = {"filename": upload["filename"], "status": "linked", "file_id": linked_id}
+        linked.append((i, upload))
+    if linked:
+        answer_cache.invalidate_files(await asyncio.to_thread(get_scope_file_ids, session_id))
+
+    file_ids = await asyncio.to_thread(insert_document_records, [
+        (session_id, upload["filename"], "", upload["content_hash"]) for _, upload in new_uploads])
+
+    if async_ingest:
+        for i, upload in linked:
+            await asyncio.to_thread(submit_linked_job, upload["job_id"], upload["filename"], session_id,
+                                    results[i]["file_id"])
+            results[i]["job_id"] = upload["job_id"]
+        for (i, upload), file_id in zip(new_uploads, file_ids):
+            await asyncio.to_thread(submit_ingestion_job, upload["job_id"], upload["file_path"], upload["filename"],
+                                    session_id, content_hash=upload["content_hash"], file_id=file_id)
+            results[i] = {"filename": upload["filename"], "status": "queued", "file_id": file_id, "job_id": upload["job_id"]}
+        _fill_duplicates(files, results, duplicates)
+        return {"session_id": session_id, "results": results}
+
+    slots = asyncio.Semaphore(BATCH_UPLOAD_CONCURRENCY)
+
+    async def index_one(upload: dict, file_id: int):
+        result = {"filename": upload["filename"], "file_id": file_id}
+        spool_kept = False
+        try:
+            async with slots:
+                ingested = await asyncio.to_thread(ingest_file, upload["file_path"], upload["filename"], session_id,
+                                                   file_id=file_id, keep_partial=True, content_hash=upload["content_hash"])
+        except IndexingError as e:
+            logging.error(f"Error indexing document {upload['filename']}: {e}")
+            await asyncio.to_thread(keep_failed_upload, upload["job_id"], upload["file_path"], upload["filename"],
+                                    session_id, upload["content_hash"], e)
+            spool_kept = True
+            return {"filename": upload["filename"], "status": "failed", "file_id": file_id, "job_id": upload["job_id"],
+                    "error": f"Failed to index {upload['filename']}. Resume it with POST /jobs/{upload['job_id']}/retry."}
+        except Exception as e:
+            logging.error(f"Error indexing document {upload['filename']}: {e}")
+            return {"filename": upload["filename"], "status": "failed", "error": f"Failed to index {upload['filename']}."}
+        finally:
+            if not spool_kept and os.path.exists(upload["file_path"]):
+                os.remove(upload["file_path"])
+        logging.info(f"Indexed file_id {file_id}: {ingested.pages} pages, {len(ingested.splits)} chunks, timings {ingested.timings}")
+        result["status"] = "indexed"
+        return await _summarize_batch_file(result, ingested.content, ingested.timings)
+
+    async def summarize_linked(result: dict):
+        content = await asyncio.to_thread(get_file_content, result["file_id"])
+        return await _summarize_batch_file(result, content, {})
+
+    tasks = [(i, index_one(upload, file_id)) for (i, upload), file_id in zip(new_uploads, file_ids)]
+    tasks += [(i, summarize_linked(results[i])) for i, _ in linked]
+    for (i, _), result in zip(tasks, await asyncio.gather(*(task for _, task in tasks))):
+        results[i] = result
+    _fill_duplicates(files, results, duplicates)
+    return {"session_id": session_id, "results": results,
+            "timings": {"total": round(time.perf_counter() - batch_start, 4)}}
+
+@app.get("/jobs/{job_id}", response_model=JobStatus)
+def get_job_status(job_id: str):
+    job = get_ingestion_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobStatus(
+        job_id=job["id"],
+        status=job["status"],
+        filename=job["filename"],
+        session_id=job["session_id"],
+        file_id=job["file_id"],
+        pages_parsed=job["pages_parsed"],
+        pages_total=job["pages_total"],
+        chunks_embedded=job["chunks_embedded"],
+        summary_ready=bool(job["summary_ready"]),
+        summary=job["summary"],
+        error=job["error"]
+    )
+
+@app.post("/jobs/{job_id}/retry", response_model=JobStatus)
+def retry_job(job_id: str):
+    if get_ingestion_job(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not retry_ingestion_job(job_id):
+        raise HTTPException(status_code=409, detail="Only failed jobs whose upload is still spooled can be retried")
+    return get_job_status(job_id)
 
 @app.get("/list-docs", response_model=list[DocumentInfo])
 def list_documents(session_id: str):
     return get_all_documents(session_id)
 
+@app.get("/healthz")
+def healthz():
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    checks = await asyncio.to_thread(check_readiness)
+    ready = all(status == "ok" for status in checks.values())
+    return JSONResponse(status_code=200 if ready else 503,
+                        content={"status": "ready" if ready else "not ready", "checks": checks})
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/cache-stats")
+def cache_stats():
+    return {"answers": answer_cache.stats(), "embeddings": embeddings.stats()}
+
 @app.post("/delete-doc")
 def delete_document(request: DeleteFileRequest):
-    pinecone_delete_success = delete_doc_from_pinecone(request.file_id)
+    answer_cache.invalidate_files(get_scope_file_ids(None, request.file_id))
+    # Vectors shared with other sessions' uploads of the same content are kept
+    owner_id = release_document_record(request.file_id)
+    if owner_id is None:
+        return {"message": f"Successfully deleted document with file_id {request.file_id} from the system."}
+    pinecone_delete_success = delete_doc_from_pinecone(owner_id)
 
     if pinecone_delete_success:
-        db_delete_success = delete_document_record(request.file_id)
+        db_delete_success = delete_document_record(owner_id)
         if db_delete_success:
             return {"message": f"Successfully deleted document with file_id {request.file_id} from the system."}
         else:
@@ -0,0 +1,144 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+# Seconds; covers a SQLite lookup at the low end and a long LLM call at the top.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per label combination."""
+
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...], labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.labelnames = labelnames
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else _number(bound)
+                    labels = _labels(self.labelnames, key, f'le="{le}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(round(total, 6))}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+stage_latency = Histogram("rag_stage_duration_seconds", "Time spent in each stage of a chat or upload request.",
+                          LATENCY_BUCKETS, ("stage",))
+request_tokens = Histogram("rag_request_tokens", "Tokens per chat request: chat history, prompt sent and context tokens saved.",
+                           TOKEN_BUCKETS, ("kind",))
+llm_latency = Histogram("rag_llm_request_duration_seconds", "LLM request latency, including the wait for a slot.",
+                        LATENCY_BUCKETS, ("model",))
+llm_tokens = Counter("rag_llm_tokens_total", "Tokens reported by the LLM API.", ("model", "kind"))
+llm_errors = Counter("rag_llm_errors_total", "LLM requests that failed or timed out.", ("model",))
+route_decisions = Counter("rag_route_decisions_total", "Model chosen for each routed task, with the reason.",
+                          ("task", "model", "reason"))
+routed_latency = Histogram("rag_routed_task_duration_seconds", "Latency of routed LLM work by task and chosen model.",
+                           LATENCY_BUCKETS, ("task", "model"))
+
+_caches: Dict[str, Callable[[], dict]] = {}
+
+
+def register_cache(name: str, stats: Callable[[], dict]):
+    """Expose a cache's ``stats()`` (hits, misses, entries) on /metrics."""
+    _caches[name] = stats
+
+
+def observe_stage(stage: str, seconds: float, timings: Optional[Dict[str, float]] = None):
+    stage_latency.observe(seconds, stage=stage)
+    if timings is not None:
+        timings[stage] = round(seconds, 4)
+
+
+@contextmanager
+def timed(stage: str, timings: Optional[Dict[str, float]] = None):
+    """Record the block's duration under ``stage``, and in ``timings`` if given."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start, timings)
+
+
+def _render_caches() -> List[str]:
+    stats = {name: fn() for name, fn in _caches.items()}
+    lines = []
+    for metric, field, kind, help in (
+        ("rag_cache_hits_total", "hits", "counter", "Cache lookups that found an entry."),
+        ("rag_cache_misses_total", "misses", "counter", "Cache lookups that found nothing."),
+        ("rag_cache_hit_ratio", "hit_rate", "gauge", "Hits over lookups since startup."),
+        ("rag_cache_entries", "entries", "gauge", "Entries currently held."),
+    ):
+        lines += [f"# HELP {metric} {help}", f"# TYPE {metric} {kind}"]
+        lines += [f'{metric}{{cache="{_escape(name)}"}} {_number(s[field])}' for name, s in sorted(stats.items())]
+    return lines
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in (stage_latency, request_tokens, llm_latency, llm_tokens, llm_errors, route_decisions, routed_latency):
+        lines += metric.render()
+    lines += _render_caches()
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,17 @@
+from backend.db_utils import get_documents_in_default_namespace, set_document_namespace
+from backend.pinecone_utilis import move_doc_to_namespace
+
+
+def migrate_vectors_to_session_namespaces():
+    """Move vectors indexed before per-session namespaces into their session's namespace."""
+    documents = get_documents_in_default_namespace()
+    for doc in documents:
+        move_doc_to_namespace(doc["id"], doc["session_id"])
+        set_document_namespace(doc["id"], doc["session_id"])
+        print(f"Moved file_id {doc['id']} into namespace {doc['session_id']}")
+    return len(documents)
+
+
+if __name__ == "__main__":
+    migrated = migrate_vectors_to_session_namespaces()
+    print(f"Migrated {migrated} documents.")
@@ -0,0 +1,97 @@
+import logging
+import os
+import re
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Optional
+
+from backend.llm_clients import DEFAULT_MODEL
+from backend.metrics import route_decisions, routed_latency
+from backend.pydantic_models import ModelName
+
+
+# Models the "auto" choice picks between.
+ROUTER_SMALL_MODEL = os.getenv("ROUTER_SMALL_MODEL", ModelName.GPT4_O_MINI.value)
+ROUTER_LARGE_MODEL = os.getenv("ROUTER_LARGE_MODEL", ModelName.GPT4_O.value)
+# Questions of at most this many words count as short.
+ROUTER_SHORT_QUERY_WORDS = int(os.getenv("ROUTER_SHORT_QUERY_WORDS", "12"))
+# Context at least this large, drawn from two or more documents, goes to the large model.
+ROUTER_LARGE_CONTEXT_TOKENS = int(os.getenv("ROUTER_LARGE_CONTEXT_TOKENS", "1500"))
+ROUTER_MULTI_DOCUMENT_SOURCES = 2
+
+# Words that ask for synthesis rather than lookup.
+SYNTHESIS_CUES = re.compile(r"\b(compare|contrast|differen\w*|relat\w*|synthes\w*|summari[sz]\w*|trade-?offs?|"
+                            r"implications?|critique|evaluate|why|across|overall)\b", re.IGNORECASE)
+
+
+@dataclass
+class RouteDecision:
+    task: str
+    model: str
+    reason: str
+
+
+def _explicit(task: str, requested: Optional[ModelName]) -> Optional[RouteDecision]:
+    if requested is None:
+        return RouteDecision(task, DEFAULT_MODEL, "default")
+    if requested != ModelName.AUTO:
+        return RouteDecision(task, requested.value, "requested")
+    return None
+
+
+def route_condense(requested: Optional[ModelName]) -> RouteDecision:
+    """Rewriting a follow-up into a standalone question is always a small job."""
+    return _explicit("condense", requested) or RouteDecision("condense", ROUTER_SMALL_MODEL, "rewrite")
+
+
+def route_answer(task: str, requested: Optional[ModelName], question: str, context_tokens: int,
+                 documents: int) -> RouteDecision:
+    """Pick the model that answers ``question`` over the assembled context.
+
+    Under "auto", long context from several documents and questions asking
+    for synthesis go to the large model; short or lookup-style questions
+    go to the small one.
+    """
+    decision = _explicit(task, requested)
+    if decision is not None:
+        return decision
+    if documents >= ROUTER_MULTI_DOCUMENT_SOURCES and context_tokens >= ROUTER_LARGE_CONTEXT_TOKENS:
+        return RouteDecision(task, ROUTER_LARGE_MODEL, "multi_document")
+    if len(question.split()) <= ROUTER_SHORT_QUERY_WORDS:
+        return RouteDecision(task, ROUTER_SMALL_MODEL, "short_query")
+    if SYNTHESIS_CUES.search(question):
+        return RouteDecision(task, ROUTER_LARGE_MODEL, "synthesis")
+    return RouteDecision(task, ROUTER_SMALL_MODEL, "simple_query")
+
+
+def route_summary(requested: Optional[ModelName], sections: int) -> RouteDecision:
+    decision = _explicit("summary", requested)
+    if decision is not None:
+        return decision
+    # A multi-section document is merged map-reduce style; a single section is a plain summary
+    if sections > 1:
+        return RouteDecision("summary", ROUTER_LARGE_MODEL, "long_document")
+    return RouteDecision("summary", ROUTER_SMALL_MODEL, "short_document")
+
+
+def route_chat_memory() -> RouteDecision:
+    """Folding old turns into the rolling summary is a small job whatever model answered them."""
+    return RouteDecision("chat_memory", ROUTER_SMALL_MODEL, "compaction")
+
+
+def route_challenge(requested: Optional[ModelName]) -> RouteDecision:
+    return _explicit("challenge", requested) or RouteDecision("challenge", ROUTER_SMALL_MODEL, "question_generation")
+
+
+@contextmanager
+def routed(decision: RouteDecision):
+    """Yield the chosen model and record the decision with how long the block took."""
+    start = time.perf_counter()
+    try:
+        yield decision.model
+    finally:
+        seconds = time.perf_counter() - start
+        route_decisions.inc(task=decision.task, model=decision.model, reason=decision.reason)
+        routed_latency.observe(seconds, task=decision.task, model=decision.model)
+        logging.info(f"Route {decision.task} -> {decision.model} ({decision.reason}) in {seconds:.3f}s")
@@ -0,0 +1,156 @@
+import logging
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from langchain_core.document_loaders import BaseLoader
+from langchain_core.documents import Document
+from pypdf import PdfReader
+
+
+# Worker processes extracting PDF text; 1 keeps parsing in the calling thread.
+PDF_PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", str(os.cpu_count() or 1)))
+# Pages extracted but not yet consumed by the splitter, across all tasks of one file.
+PDF_MAX_INFLIGHT_PAGES = int(os.getenv("PDF_MAX_INFLIGHT_PAGES", "64"))
+# Pages handed to a worker per task; amortizes opening the file in the worker.
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_worker_reader: Tuple[Optional[tuple], Optional[PdfReader]] = (None, None)
+
+
+def get_parser_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the API process runs threads that must not be copied mid-lock
+            _pool = ProcessPoolExecutor(max_workers=PDF_PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _discard_parser_pool(broken: ProcessPoolExecutor):
+    # The next parse starts a fresh pool; other files may have replaced it already
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_parser_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _page_texts(reader: PdfReader, page_numbers: List[int]) -> List[Tuple[int, str, str]]:
+    labels = reader.page_labels
+    return [(page_no, reader.pages[page_no].extract_text().strip(), labels[page_no]) for page_no in page_numbers]
+
+
+def _info_metadata(reader: PdfReader) -> dict:
+    """Document info fields under the keys ``PyPDFLoader`` uses: lowercase, no slash, ISO dates."""
+    metadata = {"producer": "PyPDF", "creator": "PyPDF", "creationdate": ""}
+    for key, value in (reader.metadata or {}).items():
+        key, value = key.lstrip("/").lower(), str(value).strip()
+        if key in ("creationdate", "moddate"):
+            try:
+                value = datetime.strptime(value.replace("'", ""), "D:%Y%m%d%H%M%S%z").isoformat("T")
+            except ValueError:
+                pass
+        metadata[key] = value
+    return metadata
+
+
+def extract_pages(file_path: str, page_numbers: List[int]) -> List[Tuple[int, str, str]]:
+    """Worker task: (page number, text, page label) for each requested page."""
+    global _worker_reader
+    # Consecutive tasks of the same file reuse the parsed cross-reference table
+    stat = os.stat(file_path)
+    key = (file_path, stat.st_mtime_ns, stat.st_size)
+    cached_key, reader = _worker_reader
+    if cached_key != key:
+        reader = PdfReader(file_path)
+        _worker_reader = (key, reader)
+    return _page_texts(reader, page_numbers)
+
+
+class ParallelPDFLoader(BaseLoader):
+    """Streams the pages of a PDF, extracting their text in a process pool.
+
+    Pages come out in order with the same metadata ``PyPDFLoader`` sets.
+    At most ``max_inflight_pages`` extracted pages wait for the consumer,
+    so memory stays bounded however long the document is. ``on_page`` is
+    called with (pages done, total pages) as each page is yielded. If a
+    worker dies, the pool is replaced for later files and the rest of this
+    one is extracted in the calling thread.
+    """
+
+    def __init__(self, file_path: str, workers: int = PDF_PARSE_WORKERS,
+                 max_inflight_pages: int = PDF_MAX_INFLIGHT_PAGES, pages_per_task: int = PDF_PAGES_PER_TASK,
+                 on_page: Optional[Callable[[int, int], None]] = None):
+        self.file_path = file_path
+        self.workers = workers
+        self.pages_per_task = max(1, min(pages_per_task, max_inflight_pages))
+        self.max_inflight_tasks = max(1, max_inflight_pages // self.pages_per_task)
+        self.on_page = on_page
+
+    def _tasks(self, total_pages: int, first_page: int = 0) -> Iterator[List[int]]:
+        for start in range(first_page, total_pages, self.pages_per_task):
+            yield list(range(start, min(start + self.pages_per_task, total_pages)))
+
+    def _extracted(self, reader: PdfReader, total_pages: int) -> Iterator[Tuple[int, str, str]]:
+        if self.workers <= 1 or total_pages <= self.pages_per_task:
+            # Not worth the round trip to a worker
+            for page_numbers in self._tasks(total_pages):
+                yield from _page_texts(reader, page_numbers)
+            return
+
+        pool = get_parser_pool()
+        next_page = 0
+        try:
+            for page in self._extracted_in_pool(pool, total_pages):
+                next_page = page[0] + 1
+                yield page
+        except BrokenProcessPool:
+            logging.warning(f"PDF parser pool broke while parsing {self.file_path}; finishing it in-process")
+            _discard_parser_pool(pool)
+            for page_numbers in self._tasks(total_pages, next_page):
+                yield from _page_texts(reader, page_numbers)
+
+    def _extracted_in_pool(self, pool: ProcessPoolExecutor, total_pages: int) -> Iterator[Tuple[int, str, str]]:
+        tasks = self._tasks(total_pages)
+        pending = deque()
+        try:
+            for page_numbers in tasks:
+                pending.append(pool.submit(extract_pages, self.file_path, page_numbers))
+                if len(pending) >= self.max_inflight_tasks:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def lazy_load(self) -> Iterator[Document]:
+        reader = PdfReader(self.file_path)
+        total_pages = len(reader.pages)
+        info = _info_metadata(reader)
+        for done, (page_no, text, label) in enumerate(self._extracted(reader, total_pages), start=1):
+            yield Document(page_content=text, metadata={
+                **info,
+                "source": self.file_path,
+                "page": page_no,
+                "page_label": label,
+                "total_pages": total_pages,
+            })
+            if self.on_page:
+                self.on_page(done, total_pages)
@@ -1,11 +1,17 @@
-from langchain_community.document_loaders import PyPDFLoader, TextLoader
+from langchain_community.document_loaders import TextLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings
 from pinecone import Pinecone, ServerlessSpec
 from langchain_pinecone import PineconeVectorStore
 from typing import List
 from langchain_core.documents import Document
+from backend.local_vectorstore import LocalVectorStore
+from backend.embedding_cache import CachedEmbeddings
+from backend.pdf_loader import ParallelPDFLoader
+from backend.db_utils import get_document_index_info
+import logging
 import os
+import threading
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -13,34 +19,62 @@ load_dotenv()
 PINECONE_API_KEY=os.getenv("PINECONE_API_KEY")
 OPENAI_API_KEY=os.getenv("OPENAI_API_KEY")
 
+# Vector store backend: "pinecone" (default) or "local"
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "pinecone").lower()
+LOCAL_VECTOR_STORE_PATH = os.getenv("LOCAL_VECTOR_STORE_PATH", "vector_store")
 
+# Embedding cache
+EMBEDDING_MODEL = "text-embedding-3-large"
+EMBEDDING_DIMENSIONS = 1024
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.db")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "500000"))
 
-# text splitter and embedding function
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200, length_function=len)
-embeddings = OpenAIEmbeddings(model="text-embedding-3-large", dimensions=1024, api_key=OPENAI_API_KEY)
-
-# Pinecone vector store
-pc = Pinecone(api_key=PINECONE_API_KEY)
 
-def load_and_split_document(file_path: str) -> List[Document]:
+# text splitter and embedding function
+# start_index (offset in the page) lets retrieval stitch neighbouring chunks exactly
+text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200, length_function=len, add_start_index=True)
+embeddings = CachedEmbeddings(
+    # Upload batches retry through indexing_engine.with_backoff; client retries would multiply its attempts
+    lambda: OpenAIEmbeddings(model=EMBEDDING_MODEL, dimensions=EMBEDDING_DIMENSIONS, api_key=OPENAI_API_KEY, max_retries=0),
+    model=EMBEDDING_MODEL,
+    dimensions=EMBEDDING_DIMENSIONS,
+    path=EMBEDDING_CACHE_PATH,
+    max_entries=EMBEDDING_CACHE_MAX_ENTRIES,
+)
+
+# Clients and the vector store are created on first use (or at app startup), not at import
+_pinecone = None
+_vectorstore = None
+_vectorstore_lock = threading.Lock()
+
+def get_pinecone() -> Pinecone:
+    global _pinecone
+    if _pinecone is None:
+        _pinecone = Pinecone(api_key=PINECONE_API_KEY)
+    return _pinecone
+
+def get_document_loader(file_path: str):
     if file_path.endswith('.pdf'):
-        loader = PyPDFLoader(file_path)
+        return ParallelPDFLoader(file_path)
     elif file_path.endswith('.txt'):
-        loader = TextLoader(file_path)
+        return TextLoader(file_path)
     else:
         raise ValueError(f"Unsupported file type: {file_path}")
 
-    documents = loader.load()
-    return text_splitter.split_documents(documents)
-
 INDEX_NAME = "smart-research-assistant"
+# Pinecone accepts at most 1000 ids per delete call
+DELETE_BATCH_SIZE = 1000
+UPSERT_BATCH_SIZE = 100
+# Bound on metadata-filter query rounds when sweeping one document's legacy random-id vectors
+LEGACY_SWEEP_MAX_ROUNDS = 100
 
 def create_pinecone_vectorstore()-> PineconeVectorStore:
+    pc = get_pinecone()
     try:
         if not pc.has_index(INDEX_NAME):
             pc.create_index(
                 name=INDEX_NAME,
-                dimension=1024,
+                dimension=EMBEDDING_DIMENSIONS,
                 metric="cosine",
                 spec=ServerlessSpec(cloud="aws", region="us-east-1")
             )
@@ -49,41 +83,130 @@ def create_pinecone_vectorstore()-> PineconeVectorStore:
         return PineconeVectorStore(index=index, embedding=embeddings)
 
     except Exception as e:
-        print(f"Index initialization failed: {e}")
+        logging.error(f"Index initialization failed: {e}")
         raise
 
 
-vectorstore=create_pinecone_vectorstore()
+def create_local_vectorstore() -> LocalVectorStore:
+    return LocalVectorStore(embedding=embeddings, path=LOCAL_VECTOR_STORE_PATH, dimensions=EMBEDDING_DIMENSIONS)
+
+
+def create_vectorstore():
+    if VECTOR_STORE_BACKEND == "pinecone":
+        return create_pinecone_vectorstore()
+    if VECTOR_STORE_BACKEND == "local":
+        return create_local_vectorstore()
+    raise ValueError(f"Unsupported vector store backend: {VECTOR_STORE_BACKEND}")
+
+
+def get_vectorstore():
+    global _vectorstore
+    if _vectorstore is None:
+        with _vectorstore_lock:
+            if _vectorstore is None:
+                _vectorstore = create_vectorstore()
+    return _vectorstore
+
+def ping_vectorstore():
+    """Raise unless the vector store answers; for Pinecone this is a live stats call."""
+    vectorstore = get_vectorstore()
+    if not isinstance(vectorstore, LocalVectorStore):
+        get_pinecone().Index(INDEX_NAME).describe_index_stats()
+
+def chunk_id(file_id: int, chunk_no: int) -> str:
+    return f"{file_id}-{chunk_no}"
+
+def upsert_embeddings(splits: List[Document], vectors: List[List[float]], namespace: str = "") -> List[str]:
+    texts = [split.page_content for split in splits]
+    metadatas = [split.metadata for split in splits]
+    ids = [chunk_id(split.metadata['file_id'], split.metadata['chunk_no']) for split in splits]
+
+    vectorstore = get_vectorstore()
+    if isinstance(vectorstore, LocalVectorStore):
+        return vectorstore.add_embeddings(texts, vectors, metadatas=metadatas, ids=ids, namespace=namespace)
+
+    # Same record layout PineconeVectorStore uses, so similarity_search can read it back
+    index = get_pinecone().Index(INDEX_NAME)
+    records = [
+        {"id": id_, "values": vector, "metadata": {**metadata, "text": text}}
+        for id_, vector, metadata, text in zip(ids, vectors, metadatas, texts)
+    ]
+    # Pinecone rejects upsert requests over 2MB
+    for start in range(0, len(records), UPSERT_BATCH_SIZE):
+        index.upsert(vectors=records[start:start + UPSERT_BATCH_SIZE], namespace=namespace)
+    return ids
+
+def search_by_vector(vector: List[float], k: int, namespace: str, file_ids: List[int]) -> List[tuple]:
+    """Top-k (Document, score) pairs from one namespace, limited to ``file_ids``."""
+    file_filter = {"file_id": {"$in": file_ids}}
+    vectorstore = get_vectorstore()
+    if isinstance(vectorstore, LocalVectorStore):
+        return vectorstore.similarity_search_with_score_by_vector(vector, k=k, filter=file_filter, namespace=namespace)
+    return vectorstore.similarity_search_by_vector_with_score(vector, k=k, filter=file_filter, namespace=namespace)
 
-def index_document_to_pinecone(file_path: str, file_id: int) -> bool:
-    try:
-        splits = load_and_split_document(file_path)
-
-        # Add metadata to each split
-        for split in splits:
-            split.metadata['file_id'] = file_id
-
-        vectorstore.add_documents(splits)
-        return True
-    except Exception as e:
-        print(f"Error indexing document: {e}")
-        return False
-    
 def delete_doc_from_pinecone(file_id: int):
+    vectorstore = get_vectorstore()
+    info = get_document_index_info(file_id) or {}
+    chunk_count = info.get("chunk_count")
+    namespace = info.get("vector_namespace") or ""
     try:
-        index = pc.Index(INDEX_NAME)
-        # Query for all vectors with file_id metadata
-        query_result = index.query(
-            vector=[0.0]*1024,  
-            filter={"file_id": {"$eq": str(file_id)}},
-            top_k=10000,  
-            include_metadata=True
-        )
-        ids = [match["id"] for match in query_result["matches"]]
-        if ids:
-            index.delete(ids=ids)
+        if chunk_count is not None:
+            ids = [chunk_id(file_id, chunk_no) for chunk_no in range(chunk_count)]
+            for start in range(0, len(ids), DELETE_BATCH_SIZE):
+                vectorstore.delete(ids=ids[start:start + DELETE_BATCH_SIZE], namespace=namespace)
+        elif isinstance(vectorstore, LocalVectorStore):
+            vectorstore.delete_by_file_id(file_id)
+        else:
+            index = get_pinecone().Index(INDEX_NAME)
+            # Chunk count not recorded (e.g. a failed upload): list our ids by prefix
+            for ids in index.list(prefix=f"{file_id}-", namespace=namespace):
+                index.delete(ids=ids, namespace=namespace)
+            # Vectors indexed with random ids before chunk ids were deterministic
+            if not info.get("deterministic_ids"):
+                for ids in iter_legacy_vector_ids(index, file_id, namespace):
+                    index.delete(ids=ids, namespace=namespace)
         return True
     except Exception as e:
-        print(f"Error deleting from Pinecone: {str(e)}")
+        logging.error(f"Error deleting from vector store: {str(e)}")
         return False
 
+def iter_legacy_vector_ids(index, file_id: int, namespace: str):
+    # Pages through a metadata-filter query; callers must delete or move each page.
+    # Deletes are eventually consistent, so a later page may repeat ids already
+    # handled: those are skipped, and a page with nothing new ends the sweep.
+    seen = set()
+    for _ in range(LEGACY_SWEEP_MAX_ROUNDS):
+        query_result = index.query(
+            vector=[0.0]*EMBEDDING_DIMENSIONS,
+            filter={"file_id": {"$eq": file_id}},
+            top_k=DELETE_BATCH_SIZE,
+            namespace=namespace
+        )
+        ids = [match["id"] for match in query_result["matches"] if match["id"] not in seen]
+        if not ids:
+            return
+        seen.update(ids)
+        yield ids
+    logging.warning(f"Stopped sweeping legacy vectors of file_id {file_id} after {LEGACY_SWEEP_MAX_ROUNDS} rounds")
+
+def move_doc_to_namespace(file_id: int, namespace: str):
+    """Move an already indexed document's vectors out of the default namespace."""
+    vectorstore = get_vectorstore()
+    if isinstance(vectorstore, LocalVectorStore):
+        vectorstore.set_namespace(file_id, namespace)
+        return
+
+    index = get_pinecone().Index(INDEX_NAME)
+    pages = list(index.list(prefix=f"{file_id}-", namespace=""))
+    if not pages:
+        pages = iter_legacy_vector_ids(index, file_id, "")
+    for ids in pages:
+        # fetch is limited to 100 ids per call
+        for start in range(0, len(ids), 100):
+            batch = ids[start:start + 100]
+            fetched = index.fetch(ids=batch, namespace="").vectors
+            index.upsert(vectors=[
+                {"id": id_, "values": vector.values, "metadata": vector.metadata}
+                for id_, vector in fetched.items()
+            ], namespace=namespace)
+            index.delete(ids=batch, namespace="")
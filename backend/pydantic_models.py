@@ -1,20 +1,29 @@
 from pydantic import BaseModel, Field
 from enum import Enum
 from datetime import datetime
+from typing import Dict, Optional
 
 class ModelName(str, Enum):
     GPT4_O = "gpt-4o"
     GPT4_O_MINI = "gpt-4o-mini"
+    # Let the server pick per request: the small model for short or simple work, the large one for synthesis
+    AUTO = "auto"
 
 class QueryInput(BaseModel):
     question: str
     session_id: str = Field(default=None)
     model: ModelName = Field(default=ModelName.GPT4_O_MINI)
+    file_id: Optional[int] = None
 
 class QueryResponse(BaseModel):
     answer: str
     session_id: str
     model: ModelName
+    prompt_tokens: Optional[int] = None
+    timings: Optional[Dict[str, float]] = None
+    context_tokens_saved: Optional[int] = None
+    # Model that produced the answer; differs from ``model`` under "auto"
+    routed_model: Optional[str] = None
 
 class DocumentInfo(BaseModel):
     id: int
@@ -26,8 +35,29 @@ class DeleteFileRequest(BaseModel):
 
 class ChallengeRequest(BaseModel):
     file_id: int
+    regenerate: bool = False
+    model: Optional[ModelName] = None
+
+class SummaryRequest(BaseModel):
+    file_id: int
+    regenerate: bool = False
+    model: Optional[ModelName] = None
 
 class EvaluateAnswer(BaseModel):
     file_id: int
     question: str
     user_answer: str
+    model: Optional[ModelName] = None
+
+class JobStatus(BaseModel):
+    job_id: str
+    status: str
+    filename: str
+    session_id: str
+    file_id: Optional[int] = None
+    pages_parsed: int = 0
+    pages_total: Optional[int] = None
+    chunks_embedded: int = 0
+    summary_ready: bool = False
+    summary: Optional[str] = None
+    error: Optional[str] = None
@@ -0,0 +1,128 @@
+import os
+from typing import List, Optional
+
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from backend.artifact_cache import get_or_create_artifact, lookup_artifact, store_artifact
+from backend.langchain_utils import output_parser
+from backend.llm_clients import DEFAULT_MODEL, model_pool
+from backend.model_router import RouteDecision, route_challenge, route_summary, routed
+from backend.pydantic_models import ModelName
+from backend.token_utils import count_tokens
+
+
+# Documents longer than one section are summarized map-reduce style.
+SECTION_TOKENS = int(os.getenv("SUMMARY_SECTION_TOKENS", "6000"))
+SUMMARY_MAX_CONCURRENCY = int(os.getenv("SUMMARY_MAX_CONCURRENCY", "4"))
+
+summary_prompt = ChatPromptTemplate.from_messages([
+    ("system", "You are a helpful assistant. Summarize the following document in no more than 150 words. Focus on the main points and key findings. Do not include information not present in the document."),
+    ("human", "{document}")
+])
+
+section_summary_prompt = ChatPromptTemplate.from_messages([
+    ("system", "You are a helpful assistant. Summarize the following section of a longer document in no more than 200 words. Keep its main claims, methods, results and any definitions later sections may rely on. Do not include information not present in the section."),
+    ("human", "{section}")
+])
+
+combine_prompt = ChatPromptTemplate.from_messages([
+    ("system", "You are a helpful assistant. The following are summaries of consecutive parts of one document. Merge them into a single summary of no more than 300 words that keeps the main points and key findings. Do not include information not present in the summaries."),
+    ("human", "{summaries}")
+])
+
+challenge_prompt = ChatPromptTemplate.from_messages([
+    ("system", "You are a helpful AI assistant. Generate three logic-based or comprehension-focused questions about the following document. Each question should require understanding or reasoning about the document content, not just simple recall. Provide each question on a new line."),
+    ("human", "Document: {context}\n\nQuestions:")
+])
+
+section_splitter = RecursiveCharacterTextSplitter(chunk_size=SECTION_TOKENS, chunk_overlap=0, length_function=count_tokens)
+
+
+def split_into_sections(content: str) -> List[str]:
+    return section_splitter.split_text(content)
+
+
+def _invoke(prompt: ChatPromptTemplate, inputs: dict, model_name: str = DEFAULT_MODEL) -> str:
+    return output_parser.invoke(model_pool.invoke(model_name, prompt.format_messages(**inputs)))
+
+
+def _run_concurrently(prompt: ChatPromptTemplate, inputs: List[dict], model_name: str = DEFAULT_MODEL) -> List[str]:
+    responses = model_pool.batch(model_name, [prompt.format_messages(**i) for i in inputs], SUMMARY_MAX_CONCURRENCY)
+    return [output_parser.invoke(response) for response in responses]
+
+
+def summarize_sections(sections: List[str], model_name: str = DEFAULT_MODEL) -> List[str]:
+    """Map step: summarize every section in parallel, reusing stored section summaries."""
+    summaries = [lookup_artifact(section, "section_summary", model_name) for section in sections]
+    missing = [i for i, summary in enumerate(summaries) if summary is None]
+    if missing:
+        results = _run_concurrently(section_summary_prompt, [{"section": sections[i]} for i in missing], model_name)
+        for i, summary in zip(missing, results):
+            store_artifact(sections[i], "section_summary", model_name, summary)
+            summaries[i] = summary
+    return summaries
+
+
+def _group_by_tokens(texts: List[str], max_tokens: int) -> List[List[str]]:
+    groups, current, used = [], [], 0
+    for text in texts:
+        tokens = count_tokens(text)
+        if current and used + tokens > max_tokens:
+            groups.append(current)
+            current, used = [], 0
+        current.append(text)
+        used += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+def reduce_summaries(summaries: List[str], model_name: str = DEFAULT_MODEL) -> str:
+    """Reduce step: merge partial summaries level by level until one prompt fits."""
+    while True:
+        groups = _group_by_tokens(summaries, SECTION_TOKENS)
+        if len(groups) == 1:
+            return "\n\n".join(groups[0])
+        summaries = _run_concurrently(combine_prompt, [{"summaries": "\n\n".join(group)} for group in groups], model_name)
+
+
+def _summarize_document(docs_content: str, model_name: str) -> str:
+    sections = split_into_sections(docs_content)
+    if len(sections) <= 1:
+        return _invoke(summary_prompt, {"document": docs_content}, model_name)
+    combined = reduce_summaries(summarize_sections(sections, model_name), model_name)
+    return _invoke(summary_prompt, {"document": combined}, model_name)
+
+
+def _generate_challenge_questions(docs_content: str, model_name: str) -> List[str]:
+    sections = split_into_sections(docs_content)
+    if len(sections) <= 1:
+        context = docs_content
+    else:
+        # Questions are drawn from the section summaries instead of the full text
+        section_summaries = summarize_sections(sections, model_name)
+        context = reduce_summaries([f"Section {i + 1}: {summary}" for i, summary in enumerate(section_summaries)],
+                                   model_name)
+    questions_str = _invoke(challenge_prompt, {"context": context}, model_name)
+    return [q.strip() for q in questions_str.split('\n') if q.strip()][:3]
+
+
+def _routed(decision: RouteDecision, fn, *args):
+    with routed(decision) as model_name:
+        return fn(*args, model_name)
+
+
+def summarize_document(docs_content: str, regenerate: bool = False, model: Optional[ModelName] = None) -> str:
+    # Only "auto" needs the section count, so other requests skip the split
+    sections = len(split_into_sections(docs_content)) if model == ModelName.AUTO else 1
+    decision = route_summary(model, sections)
+    return get_or_create_artifact(docs_content, "summary", decision.model,
+                                  lambda: _routed(decision, _summarize_document, docs_content), regenerate=regenerate)
+
+
+def generate_challenge_questions(docs_content: str, regenerate: bool = False, model: Optional[ModelName] = None) -> List[str]:
+    decision = route_challenge(model)
+    return get_or_create_artifact(docs_content, "challenge_questions", decision.model,
+                                  lambda: _routed(decision, _generate_challenge_questions, docs_content),
+                                  regenerate=regenerate)
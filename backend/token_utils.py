@@ -0,0 +1,38 @@
+from functools import lru_cache
+from typing import List
+
+import tiktoken
+from langchain_core.messages import BaseMessage
+
+
+# gpt-4o / gpt-4.1 tokenizer
+ENCODING_NAME = "o200k_base"
+# Per-message framing overhead in the chat format
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    try:
+        return tiktoken.get_encoding(ENCODING_NAME)
+    except Exception:
+        # The BPE file is downloaded on first use; fall back to an estimate offline.
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    encoding = get_encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+
+
+def count_message_tokens(messages: List[BaseMessage]) -> int:
+    return sum(count_tokens(str(message.content)) + MESSAGE_OVERHEAD_TOKENS for message in messages)
@@ -0,0 +1,87 @@
+import os
+import random
+from typing import List
+
+
+TOPICS = [
+    "attention", "transformer", "encoder", "decoder", "embedding", "gradient", "optimizer", "dropout",
+    "retrieval", "benchmark", "latency", "throughput", "dataset", "tokenizer", "inference", "training",
+    "convolution", "recurrent", "sequence", "alignment", "evaluation", "baseline", "ablation", "layer",
+]
+FILLER = [
+    "the", "model", "results", "show", "that", "we", "propose", "a", "method", "for", "with", "improves",
+    "over", "prior", "work", "using", "our", "approach", "in", "experiments", "on", "and", "of", "is",
+]
+WORDS_PER_LINE = 12
+LINES_PER_PAGE = 40
+
+
+def page_lines(rng: random.Random, topic_words: List[str]) -> List[str]:
+    lines = []
+    for _ in range(LINES_PER_PAGE):
+        words = [rng.choice(topic_words) if rng.random() < 0.3 else rng.choice(FILLER) for _ in range(WORDS_PER_LINE)]
+        lines.append(" ".join(words).capitalize() + ".")
+    return lines
+
+
+def document_pages(doc_no: int, pages: int) -> List[List[str]]:
+    """Deterministic pages for document ``doc_no``; each document leans on a few topics."""
+    rng = random.Random(doc_no)
+    topic_words = rng.sample(TOPICS, 4)
+    return [page_lines(rng, topic_words) for _ in range(pages)]
+
+
+def write_txt(path: str, pages: List[List[str]]):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join("\n".join(lines) for lines in pages))
+
+
+def write_pdf(path: str, pages: List[List[str]]):
+    """A minimal PDF with one Helvetica text stream per page; enough for pypdf to extract."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + i * 2} 0 R" for i in range(len(pages)))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>".encode())
+    font_id = 3 + len(pages) * 2
+    for i, lines in enumerate(pages):
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + i * 2} 0 R "
+                       f"/Resources << /Font << /F1 {font_id} 0 R >> >> >>".encode())
+        shown = " ".join(f"({line.replace(chr(92), '').replace('(', '').replace(')', '')}) Tj 0 -14 Td" for line in lines)
+        stream = f"BT /F1 10 Tf 40 760 Td {shown} ET".encode("latin-1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def generate_corpus(directory: str, documents: int, pages: int, pdf_ratio: float = 0.5) -> List[str]:
+    """Write ``documents`` files of ``pages`` pages, about ``pdf_ratio`` of them PDFs."""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    pdf_every = round(1 / pdf_ratio) if pdf_ratio > 0 else 0
+    for doc_no in range(documents):
+        is_pdf = pdf_every and doc_no % pdf_every == 0
+        path = os.path.join(directory, f"doc_{doc_no:04d}.{'pdf' if is_pdf else 'txt'}")
+        (write_pdf if is_pdf else write_txt)(path, document_pages(doc_no, pages))
+        paths.append(path)
+    return paths
+
+
+def questions(count: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    templates = ["What does the paper say about {}?", "How is {} related to {}?", "Summarize the findings on {}.",
+                 "Why does {} matter for {}?"]
+    result = []
+    for _ in range(count):
+        template = rng.choice(templates)
+        result.append(template.format(*rng.sample(TOPICS, template.count("{}"))))
+    return result
@@ -0,0 +1,122 @@
+import asyncio
+import hashlib
+import re
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from backend.local_vectorstore import LocalVectorStore
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+class FakeChatModel(BaseChatModel):
+    """Stands in for ChatOpenAI: answers after ``latency`` seconds with text built from the prompt.
+
+    The reply is three lines (so challenge questions parse) of
+    ``output_words`` words in total, drawn deterministically from the last
+    message. Streaming yields it word by word, ``stream_delay`` apart.
+    """
+
+    model_name: str = "fake"
+    latency: float = 0.0
+    stream_delay: float = 0.0
+    output_words: int = 60
+
+    @property
+    def _llm_type(self) -> str:
+        return "benchmark-fake-chat"
+
+    def _reply(self, messages: List[BaseMessage]) -> AIMessage:
+        words = _words(str(messages[-1].content)) or ["empty"]
+        per_line = max(1, self.output_words // 3)
+        lines = [" ".join(words[(i * per_line + j) % len(words)] for j in range(per_line)) + "?" for i in range(3)]
+        input_tokens = sum(len(str(message.content)) // 4 + 1 for message in messages)
+        return AIMessage(content="\n".join(lines), usage_metadata={
+            "input_tokens": input_tokens, "output_tokens": self.output_words,
+            "total_tokens": input_tokens + self.output_words,
+        })
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency)
+        for token in re.split(r"(?<= )", self._reply(messages).content):
+            time.sleep(self.stream_delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency)
+        for token in re.split(r"(?<= )", self._reply(messages).content):
+            await asyncio.sleep(self.stream_delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+class FakeEmbeddings(Embeddings):
+    """Hashed bag-of-words vectors, so texts sharing words land close together.
+
+    Each call sleeps ``latency`` plus ``latency_per_input`` for every text,
+    roughly how the embeddings API scales with batch size.
+    """
+
+    def __init__(self, dimensions: int = 1024, latency: float = 0.0, latency_per_input: float = 0.0):
+        self.dimensions = dimensions
+        self.latency = latency
+        self.latency_per_input = latency_per_input
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for word in _words(text):
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.dimensions] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            vector[0], norm = 1.0, 1.0
+        return (vector / norm).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency + self.latency_per_input * len(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency)
+        return self._vector(text)
+
+
+class FakeVectorStore(LocalVectorStore):
+    """The local vector store with a simulated network round trip on every call."""
+
+    def __init__(self, *args, latency: float = 0.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latency = latency
+
+    def add_embeddings(self, *args, **kwargs):
+        time.sleep(self.latency)
+        return super().add_embeddings(*args, **kwargs)
+
+    def similarity_search_with_score_by_vector(self, *args, **kwargs):
+        time.sleep(self.latency)
+        return super().similarity_search_with_score_by_vector(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        time.sleep(self.latency)
+        return super().delete(*args, **kwargs)
@@ -0,0 +1,341 @@
+"""Offline load test for backend.main:app.
+
+OpenAI and Pinecone are replaced by the latency-configurable fakes in
+benchmarks.fakes, and requests go straight to the ASGI app through httpx,
+so a run costs nothing and needs no network. Run from the repository root:
+
+    python -m benchmarks.run --documents 20 --requests 200 --concurrency 16 --output before.json
+    python -m benchmarks.run ... --output after.json --compare before.json
+
+The run exits non-zero when the cold import of backend.main or the app's
+startup exceeds its budget.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Awaitable, Callable, List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Seconds a cold `import backend.main` and the lifespan startup may take.
+IMPORT_BUDGET_SECONDS = float(os.getenv("IMPORT_BUDGET_SECONDS", "3.0"))
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "2.0"))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the API with fake LLM, embedding and vector store backends.")
+    parser.add_argument("--documents", type=int, default=10, help="documents uploaded (and deleted at the end)")
+    parser.add_argument("--pages", type=int, default=5, help="pages per generated document")
+    parser.add_argument("--pdf-ratio", type=float, default=0.5, help="share of generated documents that are PDFs")
+    parser.add_argument("--sessions", type=int, default=4, help="chat sessions the documents and questions are spread over")
+    parser.add_argument("--requests", type=int, default=100, help="requests per endpoint for chat, challenge-me and evaluate-response")
+    parser.add_argument("--concurrency", type=int, default=8, help="requests in flight per endpoint")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds per fake LLM call")
+    parser.add_argument("--llm-output-words", type=int, default=60, help="words in each fake LLM reply")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="seconds per fake embedding call")
+    parser.add_argument("--embed-latency-per-input", type=float, default=0.0005, help="extra seconds per embedded text")
+    parser.add_argument("--vector-latency", type=float, default=0.02, help="seconds per fake vector store call")
+    parser.add_argument("--regenerate", action="store_true", help="bypass the artifact cache on /challenge-me")
+    parser.add_argument("--import-runs", type=int, default=3, help="cold imports of backend.main to time")
+    parser.add_argument("--import-budget", type=float, default=IMPORT_BUDGET_SECONDS,
+                        help="fail when the median cold import takes longer (seconds; 0 disables)")
+    parser.add_argument("--startup-budget", type=float, default=STARTUP_BUDGET_SECONDS,
+                        help="fail when the lifespan startup takes longer (seconds; 0 disables)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="where the corpus, databases and vector store go (default: a temp dir)")
+    parser.add_argument("--output", default="benchmark-results.json", help="JSON file the results are written to")
+    parser.add_argument("--compare", help="earlier results JSON to print latency changes against")
+    return parser.parse_args(argv)
+
+
+class RSSSampler(threading.Thread):
+    """Polls this process's resident set size so each phase can report its peak."""
+
+    def __init__(self, interval: float = 0.05):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = 0
+        self._stopped = threading.Event()
+        self._page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+    def current(self) -> int:
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * self._page_size
+        except OSError:
+            # No procfs (e.g. macOS): fall back to the lifetime peak
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+    def reset(self) -> int:
+        peak, self.peak = self.peak, self.current()
+        return max(peak, self.peak)
+
+    def run(self):
+        while not self._stopped.is_set():
+            self.peak = max(self.peak, self.current())
+            self._stopped.wait(self.interval)
+
+    def stop(self):
+        self._stopped.set()
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(latencies: List[float], errors: int, wall: float, peak_rss: int) -> dict:
+    def ms(value):
+        return round(value * 1000, 2) if value is not None else None
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / wall, 2) if wall > 0 else None,
+        "latency_ms": {
+            "mean": ms(sum(latencies) / len(latencies)) if latencies else None,
+            "p50": ms(percentile(latencies, 50)),
+            "p95": ms(percentile(latencies, 95)),
+            "p99": ms(percentile(latencies, 99)),
+            "max": ms(max(latencies)) if latencies else None,
+        },
+        "peak_rss_mb": round(peak_rss / 2**20, 1),
+    }
+
+
+async def run_phase(name: str, calls: List[Callable[[], Awaitable]], concurrency: int, sampler: RSSSampler) -> tuple:
+    """Run ``calls`` with at most ``concurrency`` in flight; returns (summary, responses)."""
+    slots = asyncio.Semaphore(concurrency)
+    latencies, responses, errors = [], [], 0
+
+    async def one(call):
+        nonlocal errors
+        async with slots:
+            start = time.perf_counter()
+            try:
+                response = await call()
+            except Exception as e:
+                errors += 1
+                print(f"{name}: {type(e).__name__}: {e}", file=sys.stderr)
+                return
+            elapsed = time.perf_counter() - start
+            if response.status_code >= 400:
+                errors += 1
+                print(f"{name}: HTTP {response.status_code} {response.text[:200]}", file=sys.stderr)
+                return
+            latencies.append(elapsed)
+            responses.append(response)
+
+    sampler.reset()
+    start = time.perf_counter()
+    await asyncio.gather(*(one(call) for call in calls))
+    summary = summarize(latencies, errors, time.perf_counter() - start, sampler.reset())
+    print(f"{name:20s} {summary['requests']:5d} req  {summary['errors']:3d} err  "
+          f"{summary['throughput_rps'] or 0:8.2f} req/s  p50 {summary['latency_ms']['p50']} ms  "
+          f"p95 {summary['latency_ms']['p95']} ms  p99 {summary['latency_ms']['p99']} ms  "
+          f"peak RSS {summary['peak_rss_mb']} MB")
+    return summary, responses
+
+
+def configure_environment(workdir: str):
+    """Point every file the backend writes at ``workdir``; must run before backend is imported."""
+    os.environ.update({
+        "VECTOR_STORE_BACKEND": "local",
+        "DB_NAME": os.path.join(workdir, "research_assistant.db"),
+        "LOCAL_VECTOR_STORE_PATH": os.path.join(workdir, "vector_store"),
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embedding_cache.db"),
+        "UPLOAD_SPOOL_DIR": os.path.join(workdir, "uploads"),
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "sk-benchmark"),
+    })
+
+
+def time_cold_import(runs: int) -> Optional[float]:
+    """Median seconds for a fresh interpreter to import backend.main."""
+    code = "import time; start = time.perf_counter(); import backend.main; print(time.perf_counter() - start)"
+    timings = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-c", code], cwd=os.getcwd(), capture_output=True, text=True,
+                                env={**os.environ, "PYTHONPATH": REPO_ROOT})
+        if result.returncode != 0:
+            print(f"Cold import failed: {result.stderr.strip()[-500:]}", file=sys.stderr)
+            return None
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+    return round(percentile(timings, 50), 4) if timings else None
+
+
+def install_fakes(args):
+    from backend import llm_clients, pinecone_utilis
+    from benchmarks.fakes import FakeChatModel, FakeEmbeddings, FakeVectorStore
+
+    def fake_chat(model: str, **kwargs):
+        return FakeChatModel(model_name=model, latency=args.llm_latency, output_words=args.llm_output_words)
+
+    llm_clients.ChatOpenAI = fake_chat
+    pinecone_utilis.embeddings.underlying = FakeEmbeddings(pinecone_utilis.EMBEDDING_DIMENSIONS, args.embed_latency,
+                                                           args.embed_latency_per_input)
+    pinecone_utilis.create_vectorstore = lambda: FakeVectorStore(
+        embedding=pinecone_utilis.embeddings, path=pinecone_utilis.LOCAL_VECTOR_STORE_PATH,
+        dimensions=pinecone_utilis.EMBEDDING_DIMENSIONS, latency=args.vector_latency)
+
+
+async def run_benchmark(args, workdir: str) -> dict:
+    import httpx
+    from benchmarks.corpus import generate_corpus, questions
+
+    paths = generate_corpus(os.path.join(workdir, "corpus"), args.documents, args.pages, args.pdf_ratio)
+    rng = random.Random(args.seed)
+    question_pool = questions(max(args.requests, 1), seed=args.seed)
+
+    import_seconds = time_cold_import(args.import_runs) if args.import_runs > 0 else None
+    start = time.perf_counter()
+    from backend.main import app
+    warm_import_seconds = time.perf_counter() - start
+    install_fakes(args)
+
+    sampler = RSSSampler()
+    sampler.start()
+    results = {}
+    try:
+        start = time.perf_counter()
+        async with app.router.lifespan_context(app):
+            startup_seconds = time.perf_counter() - start
+            print(f"import {import_seconds}s (cold), startup {startup_seconds:.3f}s")
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+                def session_of(index):
+                    return f"bench-{index % args.sessions}"
+
+                def upload(index, path):
+                    async def call():
+                        with open(path, "rb") as f:
+                            data = f.read()
+                        return await client.post("/upload-doc", files={"file": (os.path.basename(path), data)},
+                                                 data={"session_id": session_of(index)})
+                    return call
+
+                results["/upload-doc"], responses = await run_phase(
+                    "/upload-doc", [upload(i, path) for i, path in enumerate(paths)], args.concurrency, sampler)
+                file_ids = [response.json()["file_id"] for response in responses]
+                if not file_ids:
+                    raise RuntimeError("No document was uploaded; see the errors above")
+
+                def post(url, payload):
+                    return lambda: client.post(url, json=payload)
+
+                results["/chat"], _ = await run_phase("/chat", [
+                    post("/chat", {"question": question_pool[i % len(question_pool)], "session_id": session_of(i)})
+                    for i in range(args.requests)
+                ], args.concurrency, sampler)
+                results["/challenge-me"], _ = await run_phase("/challenge-me", [
+                    post("/challenge-me", {"file_id": rng.choice(file_ids), "regenerate": args.regenerate})
+                    for _ in range(args.requests)
+                ], args.concurrency, sampler)
+                results["/evaluate-response"], _ = await run_phase("/evaluate-response", [
+                    post("/evaluate-response", {"file_id": rng.choice(file_ids), "question": question_pool[i % len(question_pool)],
+                                                "user_answer": "It improves attention over the baseline."})
+                    for i in range(args.requests)
+                ], args.concurrency, sampler)
+                results["/delete-doc"], _ = await run_phase("/delete-doc", [
+                    post("/delete-doc", {"file_id": file_id}) for file_id in file_ids
+                ], args.concurrency, sampler)
+    finally:
+        sampler.stop()
+
+    return {
+        "startup": {
+            "import_seconds": import_seconds,
+            "warm_import_seconds": round(warm_import_seconds, 4),
+            "startup_seconds": round(startup_seconds, 4),
+        },
+        "endpoints": results,
+        "peak_rss_mb": round(max(sampler.peak, sampler.current()) / 2**20, 1),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_comparison(current: dict, baseline: dict):
+    print(f"\nChange against {baseline.get('commit')} ({baseline.get('created_at')}):")
+    for endpoint, stats in current["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(endpoint)
+        if not before:
+            continue
+        changes = []
+        for key in ("p50", "p95", "p99"):
+            old, new = before["latency_ms"].get(key), stats["latency_ms"].get(key)
+            if old and new is not None:
+                changes.append(f"{key} {(new - old) / old * 100:+.1f}%")
+        old_rps, new_rps = before.get("throughput_rps"), stats.get("throughput_rps")
+        if old_rps and new_rps is not None:
+            changes.append(f"throughput {(new_rps - old_rps) / old_rps * 100:+.1f}%")
+        print(f"{endpoint:20s} " + "  ".join(changes))
+
+
+def check_budgets(startup: dict, args) -> List[str]:
+    failures = []
+    if args.import_budget and args.import_runs > 0:
+        if startup["import_seconds"] is None:
+            failures.append("cold import of backend.main failed")
+        elif startup["import_seconds"] > args.import_budget:
+            failures.append(f"cold import took {startup['import_seconds']}s, budget {args.import_budget}s")
+    if args.startup_budget and startup["startup_seconds"] > args.startup_budget:
+        failures.append(f"startup took {startup['startup_seconds']}s, budget {args.startup_budget}s")
+    return failures
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    output = os.path.abspath(args.output)
+    compare = os.path.abspath(args.compare) if args.compare else None
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix="rag-benchmark-")
+    os.makedirs(workdir, exist_ok=True)
+    sys.path.insert(0, REPO_ROOT)
+    configure_environment(workdir)
+    # The app writes app.log to the working directory
+    os.chdir(workdir)
+
+    report = {
+        "commit": git_commit(),
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare", "workdir")},
+    }
+    report.update(asyncio.run(run_benchmark(args, workdir)))
+
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output} (working files in {workdir})")
+    if compare:
+        with open(compare) as f:
+            print_comparison(report, json.load(f))
+
+    failures = check_budgets(report["startup"], args)
+    for failure in failures:
+        print(f"Over budget: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
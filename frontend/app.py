@@ -1,10 +1,50 @@
 import streamlit as st
 import requests
 import uuid
+import json
 from datetime import datetime
 
 # Backend URL configuration
 BACKEND_URL = "http://localhost:8000"  
+# (connect, read) seconds; uploads and LLM calls get a longer read timeout
+REQUEST_TIMEOUT = (5, 30)
+LLM_TIMEOUT = (5, 180)
+
+def load_documents():
+    """Documents of this session, fetched once and kept until an upload or delete changes them."""
+    if st.session_state.documents is None:
+        response = api.get(f"{BACKEND_URL}/list-docs", params={"session_id": st.session_state.session_id},
+                           timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        st.session_state.documents = response.json()
+    return st.session_state.documents
+
+def stream_chat(question):
+    """Yield answer tokens from the backend's Server-Sent Events stream."""
+    with api.post(
+        f"{BACKEND_URL}/chat/stream",
+        json={
+            "question": question,
+            "session_id": st.session_state.session_id,
+            "model": "gpt-4o-mini",
+            "file_id": st.session_state.current_file
+        },
+        stream=True,
+        timeout=LLM_TIMEOUT
+    ) as response:
+        response.raise_for_status()
+        event = "message"
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                event = "message"
+            elif line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                data = json.loads(line[len("data:"):])
+                if event == "error":
+                    raise requests.RequestException(data["detail"])
+                if event == "message":
+                    yield data["token"]
 
 # Initialize session state
 if "session_id" not in st.session_state:
@@ -17,6 +57,16 @@ if "user_answers" not in st.session_state:
     st.session_state.user_answers = {}
 if "feedback" not in st.session_state:
     st.session_state.feedback = {}
+if "documents" not in st.session_state:
+    st.session_state.documents = None
+if "messages" not in st.session_state:
+    st.session_state.messages = []
+if "upload_results" not in st.session_state:
+    st.session_state.upload_results = []
+if "api" not in st.session_state:
+    # Pooled connections kept across reruns; one per browser session, as requests.Session is not thread-safe
+    st.session_state.api = requests.Session()
+api = st.session_state.api
 
 # Page setup
 st.set_page_config(page_title="Research Assistant", layout="wide")
@@ -27,50 +77,69 @@ with st.sidebar:
     st.header("Document Management")
     
     # Document upload
-    uploaded_file = st.file_uploader("Upload Document (PDF/TXT)", type=["pdf", "txt"])
-    if uploaded_file:
-        if st.button("Upload Document"):
-            response = requests.post(
-                f"{BACKEND_URL}/upload-doc",
-                files={"file": (uploaded_file.name, uploaded_file, "application/octet-stream")},
-                data={"session_id": st.session_state.session_id}
-            )
-            if response.status_code == 200:
-                data = response.json()
-                st.session_state.current_file = data["file_id"]
-                st.success(f"Document uploaded successfully! ID: {data['file_id']}")
-                with st.expander("Document Summary"):
-                    st.write(data["summary"])
+    uploaded_files = st.file_uploader("Upload Documents (PDF/TXT)", type=["pdf", "txt"], accept_multiple_files=True)
+    if uploaded_files:
+        if st.button("Upload Documents"):
+            try:
+                response = api.post(
+                    f"{BACKEND_URL}/upload-docs",
+                    files=[("files", (f.name, f, "application/octet-stream")) for f in uploaded_files],
+                    data={"session_id": st.session_state.session_id},
+                    timeout=LLM_TIMEOUT
+                )
+                response.raise_for_status()
+            except requests.RequestException:
+                st.error("Failed to upload documents")
             else:
-                st.error("Failed to upload document")
+                st.session_state.upload_results = response.json()["results"]
+                st.session_state.documents = None
+                for result in st.session_state.upload_results:
+                    if result["status"] != "failed":
+                        st.session_state.current_file = result["file_id"]
+
+    # Results of the last upload stay visible across reruns without another request
+    for result in st.session_state.upload_results:
+        if result["status"] == "failed":
+            st.error(f"{result['filename']}: {result['error']}")
+            continue
+        st.success(f"{result['filename']} uploaded successfully! ID: {result['file_id']}")
+        if result.get("summary"):
+            with st.expander(f"Summary of {result['filename']}"):
+                st.write(result["summary"])
     
     # List documents
     st.subheader("Uploaded Documents")
     try:
-        documents = requests.get(f"{BACKEND_URL}/list-docs", params={"session_id": st.session_state.session_id}).json()
-        for doc in documents:
-            doc_id = doc["id"]
-            with st.container(border=True):
-                st.write(f"**{doc['filename']}**")
-                st.caption(f"Uploaded: {datetime.fromisoformat(doc['upload_timestamp']).strftime('%Y-%m-%d %H:%M')}")
-                st.caption(f"ID: {doc_id}")
-                
-                # Document selection
-                if st.button(f"Select", key=f"select_{doc_id}"):
-                    st.session_state.current_file = doc_id
-                
-                # Document deletion
-                if st.button(f"Delete", key=f"del_{doc_id}"):
-                    del_response = requests.post(
-                        f"{BACKEND_URL}/delete-doc",
-                        json={"file_id": doc_id}
-                    )
-                    if del_response.status_code == 200:
-                        st.rerun()
-                    else:
-                        st.error("Deletion failed")
-    except:
-        st.warning("No documents available")
+        documents = load_documents()
+    except requests.RequestException:
+        documents = []
+        st.warning("Could not load documents")
+    if not documents:
+        st.caption("No documents available")
+    for doc in documents:
+        doc_id = doc["id"]
+        with st.container(border=True):
+            st.write(f"**{doc['filename']}**")
+            st.caption(f"Uploaded: {datetime.fromisoformat(doc['upload_timestamp']).strftime('%Y-%m-%d %H:%M')}")
+            st.caption(f"ID: {doc_id}")
+            
+            # Document selection
+            if st.button(f"Select", key=f"select_{doc_id}"):
+                st.session_state.current_file = doc_id
+            
+            # Document deletion
+            if st.button(f"Delete", key=f"del_{doc_id}"):
+                try:
+                    api.post(f"{BACKEND_URL}/delete-doc", json={"file_id": doc_id},
+                             timeout=REQUEST_TIMEOUT).raise_for_status()
+                except requests.RequestException:
+                    st.error("Deletion failed")
+                else:
+                    st.session_state.documents = None
+                    st.session_state.upload_results = []
+                    if st.session_state.current_file == doc_id:
+                        st.session_state.current_file = None
+                    st.rerun()
 
 # Main interaction tabs
 ask_tab, challenge_tab = st.tabs(["Ask Anything", "Challenge Me"])
@@ -79,27 +148,24 @@ with ask_tab:
     st.subheader("Document Q&A")
     
     if st.session_state.current_file:
-        # Chat interface
-        user_question = st.text_input("Ask a question about the document:")
+        # Past turns are rendered from session state; only a newly submitted question reaches the backend
+        for message in st.session_state.messages:
+            with st.chat_message(message["role"]):
+                st.write(message["content"])
+        
+        user_question = st.chat_input("Ask a question about the document")
         
         if user_question:
-            response = requests.post(
-                f"{BACKEND_URL}/chat",
-                json={
-                    "question": user_question,
-                    "session_id": st.session_state.session_id,
-                    "model": "gpt-4o-mini"
-                }
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                st.divider()
-                st.subheader("Answer")
-                st.write(data["answer"])
-                st.caption(f"Session ID: {data['session_id']}")
-            else:
-                st.error("Failed to get response")
+            with st.chat_message("user"):
+                st.write(user_question)
+            with st.chat_message("assistant"):
+                try:
+                    answer = st.write_stream(stream_chat(user_question))
+                except requests.RequestException:
+                    st.error("Failed to get response")
+                else:
+                    st.session_state.messages.append({"role": "user", "content": user_question})
+                    st.session_state.messages.append({"role": "assistant", "content": answer})
     else:
         st.warning("Please select a document first")
 
@@ -109,14 +175,18 @@ with challenge_tab:
     if st.session_state.current_file:
         # Generate questions
         if st.button("Generate Challenge Questions"):
-            response = requests.post(
-                f"{BACKEND_URL}/challenge-me",
-                json={"file_id": st.session_state.current_file}
-            )
-            if response.status_code == 200:
-                st.session_state.challenge_questions = response.json()
-            else:
+            try:
+                response = api.post(
+                    f"{BACKEND_URL}/challenge-me",
+                    json={"file_id": st.session_state.current_file},
+                    timeout=LLM_TIMEOUT
+                )
+                response.raise_for_status()
+            except requests.RequestException:
                 st.error("Failed to generate questions")
+            else:
+                st.session_state.challenge_questions = response.json()
+                st.session_state.feedback = {}
         
         # Display questions and answer inputs
         if st.session_state.challenge_questions:
@@ -134,20 +204,22 @@ with challenge_tab:
                 
                 # Evaluate answer
                 if st.button(f"Evaluate Answer {i+1}", key=f"eval_{i}"):
-                    response = requests.post(
-                        f"{BACKEND_URL}/evaluate-response",
-                        json={
-                            "file_id": st.session_state.current_file,
-                            "question": question,
-                            "user_answer": user_answer
-                        }
-                    )
-                    if response.status_code == 200:
-                        feedback = response.json()
-                        st.session_state.feedback[i] = feedback
-                        st.success("Answer evaluated!")
-                    else:
+                    try:
+                        response = api.post(
+                            f"{BACKEND_URL}/evaluate-response",
+                            json={
+                                "file_id": st.session_state.current_file,
+                                "question": question,
+                                "user_answer": user_answer
+                            },
+                            timeout=LLM_TIMEOUT
+                        )
+                        response.raise_for_status()
+                    except requests.RequestException:
                         st.error("Evaluation failed")
+                    else:
+                        st.session_state.feedback[i] = response.json()
+                        st.success("Answer evaluated!")
                 
                 # Show feedback
                 if i in st.session_state.feedback:
@@ -0,0 +1,14 @@
+import threading
+
+import pytest
+
+from backend import db_utils
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A fresh SQLite database for the test; every thread connects to it."""
+    monkeypatch.setattr(db_utils, "DB_NAME", str(tmp_path / "test.db"))
+    monkeypatch.setattr(db_utils, "_local", threading.local())
+    monkeypatch.setattr(db_utils, "_schema_ready", False)
+    return db_utils
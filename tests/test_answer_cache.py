@@ -0,0 +1,48 @@
+import time
+
+from backend.answer_cache import SemanticAnswerCache
+
+SCOPE = (1, 2)
+
+
+def test_similar_question_over_the_same_documents_hits():
+    cache = SemanticAnswerCache(threshold=0.95)
+    cache.store(SCOPE, "what is attention?", [1.0, 0.0, 0.0], "an answer", "gpt-4o-mini")
+    assert cache.lookup(SCOPE, [0.99, 0.05, 0.0]).answer == "an answer"
+    assert cache.lookup(SCOPE, [0.5, 0.5, 0.0]) is None
+    assert cache.lookup((1,), [1.0, 0.0, 0.0]) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_a_requested_model_only_matches_its_own_answers():
+    cache = SemanticAnswerCache()
+    cache.store(SCOPE, "q", [1.0, 0.0], "small answer", "gpt-4o-mini")
+    assert cache.lookup(SCOPE, [1.0, 0.0], model="gpt-4o") is None
+    assert cache.lookup(SCOPE, [1.0, 0.0], model="gpt-4o-mini").answer == "small answer"
+    assert cache.lookup(SCOPE, [1.0, 0.0]).model == "gpt-4o-mini"
+
+
+def test_entries_expire_and_are_evicted_least_recently_used_first(monkeypatch):
+    cache = SemanticAnswerCache(ttl=10, max_entries=2)
+    cache.store(SCOPE, "a", [1.0, 0.0], "A", "m")
+    cache.store(SCOPE, "b", [0.0, 1.0], "B", "m")
+    assert cache.lookup(SCOPE, [1.0, 0.0]).answer == "A"
+    cache.store(SCOPE, "c", [-1.0, 0.0], "C", "m")
+    assert cache.lookup(SCOPE, [0.0, 1.0]) is None
+    assert cache.lookup(SCOPE, [1.0, 0.0]).answer == "A"
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 11)
+    assert cache.lookup(SCOPE, [1.0, 0.0]) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_changing_a_document_invalidates_every_scope_that_includes_it():
+    cache = SemanticAnswerCache()
+    cache.store((1, 2), "q", [1.0, 0.0], "A", "m")
+    cache.store((2, 3), "q", [1.0, 0.0], "B", "m")
+    cache.store((3,), "q", [1.0, 0.0], "C", "m")
+    cache.invalidate_files([2])
+    assert cache.lookup((1, 2), [1.0, 0.0]) is None
+    assert cache.lookup((2, 3), [1.0, 0.0]) is None
+    assert cache.lookup((3,), [1.0, 0.0]).answer == "C"
@@ -0,0 +1,43 @@
+import threading
+import time
+
+from backend.artifact_cache import get_or_create_artifact
+
+
+def test_artifacts_are_generated_once_per_content_and_model(db):
+    calls = []
+
+    def factory():
+        calls.append(1)
+        return ["Q1?", "Q2?"]
+
+    assert get_or_create_artifact("paper text", "challenge_questions", "gpt-4o-mini", factory) == ["Q1?", "Q2?"]
+    assert get_or_create_artifact("paper text", "challenge_questions", "gpt-4o-mini", factory) == ["Q1?", "Q2?"]
+    assert len(calls) == 1
+    get_or_create_artifact("paper text", "challenge_questions", "gpt-4o", factory)
+    get_or_create_artifact("other text", "challenge_questions", "gpt-4o-mini", factory)
+    get_or_create_artifact("paper text", "challenge_questions", "gpt-4o-mini", factory, regenerate=True)
+    assert len(calls) == 4
+
+
+def test_concurrent_misses_share_one_generation(db):
+    calls = []
+    barrier = threading.Barrier(8)
+    results = []
+
+    def factory():
+        calls.append(1)
+        time.sleep(0.2)
+        return "summary"
+
+    def request():
+        barrier.wait()
+        results.append(get_or_create_artifact("paper text", "summary", "gpt-4.1", factory))
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["summary"] * 8
+    assert len(calls) == 1
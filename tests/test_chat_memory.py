@@ -0,0 +1,30 @@
+from langchain_core.messages import AIMessage
+
+from backend import chat_memory
+from backend.chat_memory import CHAT_MEMORY_COMPACT_BATCH, CHAT_MEMORY_TURNS, compact_chat_memory, load_chat_memory
+from backend.model_router import ROUTER_SMALL_MODEL
+
+
+def chat(db, session_id, turns):
+    for n in range(turns):
+        db.insert_application_logs(session_id, f"question {n}", f"answer {n}", "gpt-4o-mini")
+
+
+def test_compaction_waits_for_a_full_batch(db, monkeypatch):
+    calls = []
+    monkeypatch.setattr(chat_memory.model_pool, "invoke",
+                        lambda model_name, messages: calls.append(model_name) or AIMessage(content="summary"))
+
+    chat(db, "s1", CHAT_MEMORY_TURNS + CHAT_MEMORY_COMPACT_BATCH - 1)
+    compact_chat_memory("s1")
+    assert calls == []
+    # Turns waiting for their batch are still sent verbatim
+    messages, _ = load_chat_memory("s1")
+    assert messages[0].content == "question 0"
+
+    chat(db, "s1", 1)
+    compact_chat_memory("s1")
+    assert calls == [ROUTER_SMALL_MODEL]
+    messages, _ = load_chat_memory("s1")
+    assert messages[0].content == "Summary of the earlier conversation: summary"
+    assert len(messages) == 1 + 2 * CHAT_MEMORY_TURNS
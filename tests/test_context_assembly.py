@@ -0,0 +1,44 @@
+import random
+
+from langchain_core.documents import Document
+
+from backend.context_assembly import merge_adjacent
+from backend.pinecone_utilis import text_splitter
+
+WORDS = ["model", "using", "and", "the", "attention", "layer", "results", "of", "training", "data", "we", "show"]
+
+
+def unpunctuated_page(seed, words=900):
+    rng = random.Random(seed)
+    paragraphs = [" ".join(rng.choice(WORDS) for _ in range(words // 6)) for _ in range(6)]
+    return "\n\n".join(paragraphs)
+
+
+def chunks_of(page, file_id=1):
+    splits = text_splitter.split_documents([Document(page_content=page, metadata={"file_id": file_id, "page": 0})])
+    for chunk_no, split in enumerate(splits):
+        split.metadata["chunk_no"] = chunk_no
+    return splits
+
+
+def test_neighbours_are_stitched_back_into_the_page():
+    for seed in range(20):
+        page = unpunctuated_page(seed)
+        splits = chunks_of(page)
+        assert len(splits) > 2
+        shuffled = splits[:]
+        random.Random(seed).shuffle(shuffled)
+        passages = merge_adjacent(shuffled)
+        assert len(passages) == 1
+        assert " ".join(passages[0].text.split()) == " ".join(page.split())
+
+
+def test_chunks_without_offsets_need_a_real_overlap():
+    docs = [Document(page_content="the model using", metadata={"file_id": 1, "page": 0, "chunk_no": 0}),
+            Document(page_content="using and results", metadata={"file_id": 1, "page": 0, "chunk_no": 1})]
+    assert merge_adjacent(docs)[0].text == "the model using using and results"
+
+    shared = "attention layer results of training data we show"
+    docs = [Document(page_content=f"first part {shared}", metadata={"file_id": 1, "page": 0, "chunk_no": 0}),
+            Document(page_content=f"{shared} second part", metadata={"file_id": 1, "page": 0, "chunk_no": 1})]
+    assert merge_adjacent(docs)[0].text == f"first part {shared} second part"
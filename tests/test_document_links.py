@@ -0,0 +1,80 @@
+import threading
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from backend import pinecone_utilis
+from backend.hybrid_search import lexical_search
+from backend.local_vectorstore import LocalVectorStore
+from backend.main import delete_document
+from backend.pydantic_models import DeleteFileRequest
+
+EMBEDDING = DeterministicFakeEmbedding(size=1024)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = LocalVectorStore(EMBEDDING, str(tmp_path / "vectors"))
+    monkeypatch.setattr(pinecone_utilis, "_vectorstore", store)
+    return store
+
+
+def index_document(db, session_id, content_hash, texts=("attention layers", "training data")):
+    file_id = db.insert_document_record(session_id, "paper.pdf", "", content_hash=content_hash)
+    splits = [Document(page_content=text, metadata={"file_id": file_id, "chunk_no": n, "page": 0})
+              for n, text in enumerate(texts)]
+    pinecone_utilis.upsert_embeddings(splits, EMBEDDING.embed_documents(list(texts)), namespace=session_id)
+    db.mark_chunks_indexed(file_id, [(n, 0, text, 0) for n, text in enumerate(texts)])
+    db.update_document_content(file_id, " ".join(texts), chunk_count=len(texts))
+    return file_id
+
+
+def chunk_ids(file_id, count=2):
+    return [pinecone_utilis.chunk_id(file_id, n) for n in range(count)]
+
+
+def test_link_survives_deleting_the_owner(db, store):
+    owner = index_document(db, "s1", "hash-a")
+    linked = db.link_document_record("s2", "copy.pdf", "hash-a")
+    assert linked is not None and linked != owner
+
+    delete_document(DeleteFileRequest(file_id=owner))
+    assert db.get_scope_file_ids("s1") == []
+    assert db.get_retrieval_scope("s2") == {"s1": [owner]}
+    assert len(store.get_by_ids(chunk_ids(owner))) == 2
+    assert [hit.metadata["file_id"] for hit in lexical_search("attention", [owner], k=5)] == [owner]
+    assert db.get_file_content(linked) == "attention layers training data"
+
+
+def test_last_release_removes_vectors_and_keyword_rows(db, store):
+    owner = index_document(db, "s1", "hash-a")
+    linked = db.link_document_record("s2", "copy.pdf", "hash-a")
+
+    delete_document(DeleteFileRequest(file_id=linked))
+    assert len(store.get_by_ids(chunk_ids(owner))) == 2
+    delete_document(DeleteFileRequest(file_id=owner))
+
+    assert store.get_by_ids(chunk_ids(owner)) == []
+    assert lexical_search("attention", [owner], k=5) == []
+    assert db.get_document_index_info(owner) is None
+    # Purged content is no longer offered to new uploads
+    assert db.link_document_record("s3", "again.pdf", "hash-a") is None
+
+
+def test_concurrent_releases_purge_exactly_once(db, store):
+    owner = index_document(db, "s0", "hash-a")
+    file_ids = [owner] + [db.link_document_record(f"s{n}", "copy.pdf", "hash-a") for n in range(1, 12)]
+    barrier = threading.Barrier(len(file_ids))
+    purged = []
+
+    def release(file_id):
+        barrier.wait()
+        purged.append(db.release_document_record(file_id))
+
+    threads = [threading.Thread(target=release, args=(file_id,)) for file_id in file_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(purged, key=lambda file_id: file_id is None) == [owner] + [None] * (len(file_ids) - 1)
@@ -0,0 +1,44 @@
+from langchain_core.documents import Document
+
+from backend.hybrid_search import fts_query, lexical_search, rrf_fuse
+
+
+def test_stopwords_and_short_tokens_are_dropped():
+    assert fts_query("What is the role of a attention layer in it?") == '"role" OR "attention" OR "layer"'
+    assert fts_query("what is it") is None
+
+
+def test_keyword_search_only_returns_scoped_documents(db):
+    for file_id in (1, 2, 3):
+        db.mark_chunks_indexed(file_id, [(0, 0, f"attention layers in document {file_id}", 0),
+                                         (1, 0, "unrelated text about training", 1000)])
+    hits = lexical_search("attention", [1, 3], k=10)
+    assert sorted(hit.metadata["file_id"] for hit in hits) == [1, 3]
+    assert lexical_search("attention", [2], k=10)[0].metadata["file_id"] == 2
+    # A query term that looks like a file id is only matched against chunk text
+    db.mark_chunks_indexed(42, [(0, 0, "attention layers", 0)])
+    assert lexical_search("42", [42], k=10) == []
+
+
+def test_deleted_documents_leave_the_keyword_index(db):
+    db.mark_chunks_indexed(1, [(0, 0, "attention layers", 0)])
+    db.delete_document_record(1)
+    assert lexical_search("attention", [1], k=10) == []
+
+
+def chunk(file_id, chunk_no):
+    return Document(page_content=f"{file_id}-{chunk_no}", metadata={"file_id": file_id, "chunk_no": chunk_no})
+
+
+def test_rrf_prefers_chunks_both_sides_agree_on():
+    vector = [chunk(1, 0), chunk(1, 1), chunk(2, 0)]
+    # Pinecone returns numeric metadata as floats; the same chunk must still fuse
+    lexical = [chunk(1, 1), chunk(2.0, 0.0), chunk(3, 0)]
+    fused = rrf_fuse([(vector, 1.0), (lexical, 1.0)], k=3)
+    assert [doc.page_content for doc in fused] == ["1-1", "2-0", "1-0"]
+
+
+def test_rrf_weights_tilt_the_ranking():
+    vector, lexical = [chunk(1, 0)], [chunk(2, 0)]
+    assert rrf_fuse([(vector, 1.0), (lexical, 2.0)], k=1)[0].page_content == "2-0"
+    assert rrf_fuse([(vector, 2.0), (lexical, 1.0)], k=1)[0].page_content == "1-0"
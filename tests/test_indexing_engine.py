@@ -0,0 +1,60 @@
+import pytest
+
+from backend import indexing_engine
+from backend.indexing_engine import parse_reset_duration, with_backoff
+
+
+class Response:
+    def __init__(self, headers):
+        self.headers = headers
+
+
+class ServiceError(Exception):
+    def __init__(self, status, headers=None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.response = Response(headers or {})
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(indexing_engine.time, "sleep", delays.append)
+    return delays
+
+
+def flaky(errors, result="ok"):
+    errors = list(errors)
+
+    def call():
+        if errors:
+            raise errors.pop(0)
+        return result
+    return call
+
+
+def test_transient_errors_are_retried_with_growing_delays(sleeps):
+    assert with_backoff(flaky([ServiceError(503), ServiceError(503), ServiceError(429)])) == "ok"
+    assert len(sleeps) == 3
+    assert sleeps[0] <= indexing_engine.BACKOFF_BASE_SECONDS <= sleeps[2]
+
+
+def test_the_servers_retry_after_wins(sleeps):
+    assert with_backoff(flaky([ServiceError(429, {"retry-after-ms": "1500"}),
+                               ServiceError(429, {"x-ratelimit-reset-tokens": "6m0s"})])) == "ok"
+    assert sleeps == [1.5, indexing_engine.BACKOFF_MAX_SECONDS]
+
+
+def test_permanent_errors_and_exhausted_retries_raise(sleeps):
+    with pytest.raises(ServiceError):
+        with_backoff(flaky([ServiceError(400)]))
+    assert sleeps == []
+    with pytest.raises(ServiceError):
+        with_backoff(flaky([ServiceError(503)] * 3), max_retries=2)
+    assert len(sleeps) == 2
+
+
+def test_reset_durations():
+    assert parse_reset_duration("6m0s") == 360
+    assert parse_reset_duration("20ms") == pytest.approx(0.02)
+    assert parse_reset_duration("") is None
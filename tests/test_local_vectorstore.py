@@ -0,0 +1,166 @@
+import os
+import threading
+
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from backend import local_vectorstore
+from backend.local_vectorstore import LocalVectorStore
+
+
+DIMENSIONS = 32
+
+
+def make_store(path, **kwargs):
+    return LocalVectorStore(DeterministicFakeEmbedding(size=DIMENSIONS), str(path), dimensions=DIMENSIONS, **kwargs)
+
+
+def add_file(store, file_id, vectors, namespace=""):
+    ids = [f"{file_id}-{i}" for i in range(len(vectors))]
+    store.add_embeddings([f"chunk {i} of {file_id}" for i in range(len(vectors))], vectors.tolist(),
+                         metadatas=[{"file_id": file_id} for _ in ids], ids=ids, namespace=namespace)
+    return ids
+
+
+def exact_scores(vectors, query, k):
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.sort(vectors @ (query / np.linalg.norm(query)))[::-1][:k]
+
+
+def test_file_filter_is_applied_before_ivf_probing(tmp_path):
+    rng = np.random.default_rng(1)
+    store = make_store(tmp_path, ivf_threshold=500, nprobe=1)
+    files = {file_id: rng.normal(size=(50, DIMENSIONS)) for file_id in range(40)}
+    for file_id, vectors in files.items():
+        add_file(store, file_id, vectors)
+
+    # A 50-row file is below the IVF threshold, so it is scanned exhaustively
+    query = rng.normal(size=DIMENSIONS)
+    hits = store.similarity_search_with_score_by_vector(query, k=5, filter={"file_id": {"$eq": 7}})
+    assert all(doc.metadata["file_id"] == 7 for doc, _ in hits)
+    np.testing.assert_allclose([score for _, score in hits], exact_scores(files[7], query, 5), rtol=1e-5)
+
+
+def test_large_filtered_set_probes_ivf_lists(tmp_path):
+    rng = np.random.default_rng(2)
+    store = make_store(tmp_path, ivf_threshold=500, nprobe=2)
+    files = {file_id: rng.normal(size=(100, DIMENSIONS)) for file_id in range(20)}
+    for file_id, vectors in files.items():
+        add_file(store, file_id, vectors)
+
+    scoped = {"file_id": {"$in": list(range(10))}}
+    for file_id, i in [(0, 3), (4, 50), (9, 99)]:
+        hits = store.similarity_search_with_score_by_vector(files[file_id][i], k=4, filter=scoped)
+        assert hits[0][0].id == f"{file_id}-{i}"
+        assert all(doc.metadata["file_id"] < 10 for doc, _ in hits)
+
+    # With only 2 of ~31 lists probed, the scan misses rows an exhaustive one would find
+    query = rng.normal(size=DIMENSIONS)
+    everything = np.concatenate([files[f] for f in range(10)])
+    hits = store.similarity_search_with_score_by_vector(query, k=1000, filter=scoped)
+    assert 0 < len(hits) < len(everything)
+
+
+def test_rows_added_after_training_join_existing_lists(tmp_path):
+    rng = np.random.default_rng(4)
+    store = make_store(tmp_path, ivf_threshold=500, nprobe=1)
+    for file_id in range(6):
+        add_file(store, file_id, rng.normal(size=(100, DIMENSIONS)))
+
+    late = rng.normal(size=(20, DIMENSIONS))
+    add_file(store, 99, late)
+    for i in range(len(late)):
+        doc, score = store.similarity_search_with_score_by_vector(late[i], k=1)[0]
+        assert doc.id == f"99-{i}"
+        assert score > 0.999
+
+
+def test_deleted_rows_are_not_returned_from_ivf_lists(tmp_path):
+    rng = np.random.default_rng(5)
+    store = make_store(tmp_path, ivf_threshold=500, nprobe=1)
+    files = {file_id: rng.normal(size=(100, DIMENSIONS)) for file_id in range(6)}
+    for file_id, vectors in files.items():
+        add_file(store, file_id, vectors)
+
+    store.delete(["3-10"])
+    store.delete_by_file_id(4)
+    for file_id, i in [(3, 10), (4, 0), (4, 42)]:
+        hits = store.similarity_search_with_score_by_vector(files[file_id][i], k=10)
+        assert f"{file_id}-{i}" not in [doc.id for doc, _ in hits]
+        assert all(doc.metadata["file_id"] != 4 for doc, _ in hits)
+    assert store.similarity_search_with_score_by_vector(files[3][11], k=1)[0][0].id == "3-11"
+
+
+def test_search_and_writes_proceed_while_ivf_trains(tmp_path, monkeypatch):
+    rng = np.random.default_rng(6)
+    store = make_store(tmp_path, ivf_threshold=500, nprobe=1)
+    files = {file_id: rng.normal(size=(100, DIMENSIONS)) for file_id in range(4)}
+    for file_id, vectors in files.items():
+        add_file(store, file_id, vectors)
+
+    training, release = threading.Event(), threading.Event()
+    train_centroids = local_vectorstore._train_centroids
+
+    def slow_training(matrix, rows):
+        training.set()
+        assert release.wait(10)
+        return train_centroids(matrix, rows)
+
+    monkeypatch.setattr(local_vectorstore, "_train_centroids", slow_training)
+    files[4] = rng.normal(size=(100, DIMENSIONS))
+    writer = threading.Thread(target=add_file, args=(store, 4, files[4]))
+    writer.start()
+    assert training.wait(10)
+
+    # Training has the store's rows but not its lock
+    assert store.similarity_search_with_score_by_vector(files[2][5], k=1)[0][0].id == "2-5"
+    late = rng.normal(size=(10, DIMENSIONS))
+    add_file(store, 5, late)
+    store.delete_by_file_id(1)
+    release.set()
+    writer.join(10)
+    assert not writer.is_alive()
+
+    # Writes made during training survive the swap-in of the new lists
+    for i in range(len(late)):
+        assert store.similarity_search_with_score_by_vector(late[i], k=1)[0][0].id == f"5-{i}"
+    hits = store.similarity_search_with_score_by_vector(files[1][0], k=20)
+    assert all(doc.metadata["file_id"] != 1 for doc, _ in hits)
+    assert store.similarity_search_with_score_by_vector(files[4][7], k=1)[0][0].id == "4-7"
+
+
+def test_replaced_rows_are_compacted(tmp_path):
+    rng = np.random.default_rng(3)
+    store = make_store(tmp_path)
+    vectors = rng.normal(size=(2000, DIMENSIONS))
+    add_file(store, 1, vectors)
+    add_file(store, 2, rng.normal(size=(100, DIMENSIONS)))
+    # Re-indexing the same file replaces its rows; the old ones are reclaimed
+    add_file(store, 1, vectors)
+    add_file(store, 1, vectors)
+
+    hits = store.similarity_search_with_score_by_vector(vectors[5], k=1, filter={"file_id": 1})
+    assert hits[0][0].id == "1-5"
+    assert hits[0][1] > 0.999
+
+    # Without compaction the three copies of file 1 would need room for 6100 rows
+    assert os.path.getsize(os.path.join(tmp_path, "vectors.f32")) < 6100 * DIMENSIONS * 4
+    reopened = make_store(tmp_path)
+    assert reopened.get_by_ids(["2-7"])[0].page_content == "chunk 7 of 2"
+    assert len(reopened.similarity_search_with_score_by_vector(vectors[0], k=5000)) == 2100
+
+
+def test_compaction_keeps_ivf_search_correct(tmp_path):
+    rng = np.random.default_rng(7)
+    store = make_store(tmp_path, ivf_threshold=500, nprobe=2)
+    files = {file_id: rng.normal(size=(400, DIMENSIONS)) for file_id in range(6)}
+    for file_id, vectors in files.items():
+        add_file(store, file_id, vectors)
+    for file_id in range(4):
+        store.delete_by_file_id(file_id)
+    store.compact()
+
+    for file_id, i in [(4, 0), (5, 123), (5, 399)]:
+        assert store.similarity_search_with_score_by_vector(files[file_id][i], k=1)[0][0].id == f"{file_id}-{i}"
+    hits = store.similarity_search_with_score_by_vector(files[0][0], k=50)
+    assert all(doc.metadata["file_id"] >= 4 for doc, _ in hits)
@@ -0,0 +1,37 @@
+import os
+
+from langchain_community.document_loaders import PyPDFLoader
+
+from backend import pdf_loader
+from backend.pdf_loader import ParallelPDFLoader
+from benchmarks.corpus import document_pages, write_pdf
+
+
+def sample_pdf(tmp_path, pages=6):
+    path = str(tmp_path / "sample.pdf")
+    write_pdf(path, document_pages(0, pages))
+    return path
+
+
+def test_pages_and_metadata_match_pypdf_loader(tmp_path):
+    path = sample_pdf(tmp_path)
+    expected = PyPDFLoader(path).load()
+    pages = list(ParallelPDFLoader(path, workers=1).lazy_load())
+    assert [page.page_content for page in pages] == [page.page_content for page in expected]
+    assert [page.metadata for page in pages] == [page.metadata for page in expected]
+
+
+def test_a_dead_worker_does_not_break_later_parses(tmp_path):
+    path = sample_pdf(tmp_path)
+    expected = [page.page_content for page in PyPDFLoader(path).load()]
+    broken = pdf_loader.get_parser_pool()
+    try:
+        # A worker exiting mid-task breaks the whole pool, as an OOM kill would
+        broken.submit(os._exit, 1).exception()
+        pages = list(ParallelPDFLoader(path, workers=2, pages_per_task=1).lazy_load())
+        assert [page.page_content for page in pages] == expected
+        assert pdf_loader.get_parser_pool() is not broken
+        pages = list(ParallelPDFLoader(path, workers=2, pages_per_task=1).lazy_load())
+        assert [page.page_content for page in pages] == expected
+    finally:
+        pdf_loader.shutdown_parser_pool()
@@ -0,0 +1,16 @@
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_and_startup_stay_within_budget(tmp_path):
+    # A one-document benchmark run; it exits non-zero when import or startup is over budget
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.run", "--documents", "1", "--pages", "1", "--sessions", "1",
+         "--requests", "1", "--concurrency", "1", "--import-runs", "3",
+         "--workdir", str(tmp_path), "--output", str(tmp_path / "results.json")],
+        cwd=REPO_ROOT, capture_output=True, text=True, timeout=300,
+    )
+    assert result.returncode == 0, result.stdout[-2000:] + result.stderr[-2000:]
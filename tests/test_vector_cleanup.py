@@ -0,0 +1,50 @@
+from backend import pinecone_utilis
+from backend.pinecone_utilis import LEGACY_SWEEP_MAX_ROUNDS, delete_doc_from_pinecone, iter_legacy_vector_ids
+
+
+class FakeIndex:
+    """Pinecone index whose metadata query keeps returning ids, as a lagging delete would."""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.queries = 0
+        self.deleted = []
+
+    def query(self, **kwargs):
+        page = self.pages[min(self.queries, len(self.pages) - 1)]
+        self.queries += 1
+        return {"matches": [{"id": id_} for id_ in page]}
+
+    def list(self, prefix, namespace):
+        return iter([])
+
+    def delete(self, ids, namespace):
+        self.deleted.extend(ids)
+
+
+def test_sweep_stops_when_deleted_ids_come_back():
+    index = FakeIndex([["a", "b"], ["b", "c"], ["a", "b", "c"]])
+    assert list(iter_legacy_vector_ids(index, 1, "s1")) == [["a", "b"], ["c"]]
+    assert index.queries == 3
+
+
+def test_sweep_is_bounded():
+    index = FakeIndex([[f"id-{n}"] for n in range(LEGACY_SWEEP_MAX_ROUNDS + 10)])
+    assert len(list(iter_legacy_vector_ids(index, 1, "s1"))) == LEGACY_SWEEP_MAX_ROUNDS
+
+
+def test_documents_with_deterministic_ids_skip_the_sweep(db, monkeypatch):
+    index = FakeIndex([["legacy-1"], []])
+    monkeypatch.setattr(pinecone_utilis, "get_vectorstore", lambda: object())
+    monkeypatch.setattr(pinecone_utilis, "get_pinecone", lambda: type("Client", (), {"Index": lambda self, name: index})())
+
+    file_id = db.insert_document_record("s1", "new.pdf", "")
+    assert delete_doc_from_pinecone(file_id)
+    assert index.queries == 0
+
+    # Rows from before deterministic ids still get swept
+    legacy_id = db.insert_document_record("s1", "old.pdf", "")
+    with db.transaction() as conn:
+        conn.execute("UPDATE document_store SET deterministic_ids = NULL WHERE id = ?", (legacy_id,))
+    assert delete_doc_from_pinecone(legacy_id)
+    assert index.deleted == ["legacy-1"]